@@ -1,4 +1,8 @@
+from nlhs_tick_data_hungary.network.network_preparation.co_occurrence_engine import CoOccurrenceEngine
 from nlhs_tick_data_hungary.network.network_preparation.co_occurrence_network_preprocessor import \
     CoOccurrenceNetworkPreprocessor
 from nlhs_tick_data_hungary.network.network_preparation.general_network_preprocessor import GeneralNetworkPreprocessor
+from nlhs_tick_data_hungary.network.network_preparation.winter_tick_column_index import WinterTickColumnIndex
 from nlhs_tick_data_hungary.network.sparcc.sparcc_runner import SparCCRunner
+from nlhs_tick_data_hungary.network.sparcc.clr_runner import CLRRunner
+from nlhs_tick_data_hungary.network.sparcc.sparcc_stability_engine import SparCCStabilityEngine
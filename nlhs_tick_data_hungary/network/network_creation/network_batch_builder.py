@@ -0,0 +1,210 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+import functools
+import itertools
+import typing
+
+import pandas as pd
+
+from nlhs_tick_data_hungary.network.network_creation import CoOccurrenceEngine
+from nlhs_tick_data_hungary.network.network_creation import GeneralNetworkPreprocessor
+from nlhs_tick_data_hungary.network.network_creation import WinterTickColumnIndex
+from nlhs_tick_data_hungary.network.network_creation.network_creator import NetworkCreator
+
+
+class NetworkBatchBuilder:
+    """
+    Builds the networks of every combination of the requested types of data, years and months of the winter tick data
+    in one pass.
+
+    The data is converted to numeric values once, the columns of the genders and the times are indexed once (see
+    `WinterTickColumnIndex`) and the data of every (gender, year, month) slice is preprocessed once, so the networks
+    of the same slice (e.g. the difference types, which all use the data of both genders) share the preprocessed data.
+    The crosstables of the co-occurrence networks are computed with one batched product (see `CoOccurrenceEngine`).
+    The networks can be built on a process pool.
+
+    - result (dict): The `NetworkCreator` of every (type of data, year, month) combination
+    """
+
+    # Types of data selecting the columns of a single gender, the other types use every column
+    gender_types = ['Hímek', 'Nőstények']
+
+    def __init__(self, df: pd.DataFrame,
+                 types_of_data: list, years: list, months: list,
+                 type_of_network: str,
+                 convert_to_percentage: bool = False,
+                 sparcc_args: dict = None,
+                 prefilter_args: dict = None,
+                 n_jobs: int = 1,
+                 executor: Executor | None = None) -> None:
+        """
+        Initialize the NetworkBatchBuilder with the data and the grid of networks.
+
+        :param pd.DataFrame df: The dataframe containing the data of the selected group of bacteria
+        :param list types_of_data: The types of data (e.g., 'Nőstények', 'Hímek', 'Összes', 'Különbség')
+        :param list years: The years (e.g., '2022', or an empty string for every year)
+        :param list months: The months (e.g., 'January', or an empty string for every month)
+        :param str type_of_network: The type of the networks (e.g., 'SparCC', 'CLR', 'Co-occurrence network')
+        :param bool convert_to_percentage: Whether to apply percentage transformations to the data
+        :param dict sparcc_args: Arguments for SparCC algorithm, see `NetworkCreator`
+        :param dict prefilter_args: Arguments of the prefilter of the rarely present bacteria, see `NetworkCreator`
+        :param int n_jobs: Number of worker processes building the networks (1 builds them in the current process)
+        :param Executor | None executor: An executor to build the networks with. If given, 'n_jobs' is ignored.
+        """
+        self.df = df
+        self.types_of_data = types_of_data
+        self.years = years
+        self.months = months
+        self.type_of_network = type_of_network
+        self.convert_to_percentage = convert_to_percentage
+        self.sparcc_args = sparcc_args
+        self.prefilter_args = prefilter_args
+        self.n_jobs = n_jobs
+        self.executor = executor
+
+        # Dictionary to store the created networks
+        self.result: dict = {}
+
+    def run(self):
+        """
+        Builds every network of the grid and stores them in `result`.
+        """
+        for key, network_creator in self.iterate_networks():
+            self.result[key] = network_creator
+
+    def iterate_networks(self) -> typing.Iterator[typing.Tuple[tuple, NetworkCreator]]:
+        """
+        Preprocesses the data of every slice once and builds the networks, either serially or on an executor (process
+        pool).
+
+        :return Iterator: An iterator over the (type of data, year, month) keys and the `NetworkCreator` objects with
+        the created networks, in the order of the grid.
+        """
+        keys = list(itertools.product(self.types_of_data, self.years, self.months))
+
+        # Numeric data and the index of the gender and time columns, computed once
+        numeric_df = GeneralNetworkPreprocessor.convert_to_numeric(df=self.df, as_single_array=True)
+        column_index = WinterTickColumnIndex(columns=self.df.columns)
+
+        # Preprocessed data of every (gender, year, month) slice, computed once (views of the numeric data if the
+        # columns of the slice are contiguous)
+        preprocessors = {}
+        for type_of_data, year, month in keys:
+            slice_key = (self.get_type_selection(type_of_data), year, month)
+            if slice_key not in preprocessors:
+                preprocessors[slice_key] = GeneralNetworkPreprocessor(df=numeric_df,
+                                                                      to_type=slice_key[0],
+                                                                      year=year,
+                                                                      month=month,
+                                                                      prefilter_args=self.prefilter_args,
+                                                                      is_numeric=True,
+                                                                      column_index=column_index)
+
+        # Crosstables of every (gender, year, month) slice of the co-occurrence networks with one batched product
+        co_occurrence_engine = None
+        if self.type_of_network == 'Co-occurrence network':
+            co_occurrence_engine = self.create_co_occurrence_engine(keys=keys, numeric_df=numeric_df,
+                                                                    column_index=column_index)
+
+        build_network = functools.partial(NetworkBatchBuilder.build_network, self.type_of_network,
+                                          self.convert_to_percentage, self.sparcc_args)
+        preprocessors_of_keys = [preprocessors[(self.get_type_selection(type_of_data), year, month)]
+                                 for type_of_data, year, month in keys]
+
+        if self.executor is None and (self.n_jobs is None or self.n_jobs <= 1):
+            yield from zip(keys, map(build_network, keys, preprocessors_of_keys,
+                                     itertools.repeat(co_occurrence_engine)))
+            return
+
+        # The task of a worker only gets the data of its slice and the crosstables of its network, not the whole data
+        # and every crosstable of the grid
+        detached_preprocessors = {id(preprocessor): preprocessor.detach() for preprocessor in preprocessors.values()}
+        preprocessors_of_keys = [detached_preprocessors[id(preprocessor)] for preprocessor in preprocessors_of_keys]
+        co_occurrence_engines = [co_occurrence_engine.get_subset(keys=self.get_slice_keys(key=key))
+                                 if co_occurrence_engine is not None else None for key in keys]
+
+        if self.executor is not None:
+            network_creators = self.executor.map(build_network, keys, preprocessors_of_keys, co_occurrence_engines)
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                yield from zip(keys, executor.map(build_network, keys, preprocessors_of_keys, co_occurrence_engines))
+            return
+
+        yield from zip(keys, network_creators)
+
+    @classmethod
+    def get_type_selection(cls, type_of_data: str) -> str:
+        """
+        Returns the type whose columns are used by the networks of the type of data.
+
+        :param str type_of_data: The type of data of the network
+        :return str: 'Hímek' or 'Nőstények' for the types of a single gender, 'Összes' otherwise
+        """
+        return type_of_data if type_of_data in cls.gender_types else 'Összes'
+
+    @staticmethod
+    def get_slice_keys(key: tuple) -> list:
+        """
+        Returns the keys of the slices whose crosstables the co-occurrence network of a key needs: the slice of the
+        type of data, or the slices of both genders for the difference types.
+
+        :param tuple key: The type of data, the year and the month of the network
+        :return list: The keys of the slices (see `CoOccurrenceEngine.get_key`)
+        """
+        type_of_data, year, month = key
+        types = ['Nőstények', 'Hímek'] if type_of_data in CoOccurrenceEngine.difference_types else [type_of_data]
+
+        return [CoOccurrenceEngine.get_key(to_type=to_type, year=year, month=month) for to_type in types]
+
+    @staticmethod
+    def create_co_occurrence_engine(keys: list, numeric_df: pd.DataFrame,
+                                    column_index: WinterTickColumnIndex) -> CoOccurrenceEngine:
+        """
+        Computes the crosstables of the slices of every co-occurrence network of the grid: the slice of the type of
+        data, or the slices of both genders for the difference types.
+
+        :param list keys: The (type of data, year, month) keys of the networks
+        :param pd.DataFrame numeric_df: The numeric data
+        :param WinterTickColumnIndex column_index: The index of the columns of the data
+        :return CoOccurrenceEngine: The engine with the computed crosstables
+        """
+        slices = {}
+        for key in keys:
+            for slice_key in NetworkBatchBuilder.get_slice_keys(key=key):
+                to_type, year, month = slice_key
+                slices[slice_key] = column_index.get_positions(to_type=to_type, year=year, month=month)
+
+        co_occurrence_engine = CoOccurrenceEngine(df=numeric_df, slices=slices)
+        co_occurrence_engine.run()
+
+        return co_occurrence_engine
+
+    @staticmethod
+    def build_network(type_of_network: str, convert_to_percentage: bool, sparcc_args: dict | None, key: tuple,
+                      preprocessor: GeneralNetworkPreprocessor,
+                      co_occurrence_engine: CoOccurrenceEngine | None) -> NetworkCreator:
+        """
+        Builds the network of a (type of data, year, month) combination from its preprocessed data.
+
+        :param str type_of_network: The type of the network
+        :param bool convert_to_percentage: Whether to apply percentage transformations to the data
+        :param dict | None sparcc_args: Arguments for SparCC algorithm
+        :param tuple key: The type of data, the year and the month of the network
+        :param GeneralNetworkPreprocessor preprocessor: The preprocessor with the data of the slice of the network
+        :param CoOccurrenceEngine | None co_occurrence_engine: The crosstables of the slices of the co-occurrence
+        networks
+        :return NetworkCreator: The network creator with the created network
+        """
+        type_of_data, year, month = key
+        network_creator = NetworkCreator(df=preprocessor.df,
+                                         type_of_data=type_of_data,
+                                         convert_to_percentage=convert_to_percentage,
+                                         year=year,
+                                         month=month,
+                                         type_of_network=type_of_network,
+                                         sparcc_args=sparcc_args,
+                                         prefilter_args=preprocessor.prefilter_args,
+                                         preprocessor=preprocessor,
+                                         co_occurrence_engine=co_occurrence_engine)
+        network_creator.run()
+
+        return network_creator
@@ -1,17 +1,22 @@
 import networkx as nx
+import numpy as np
 import pandas as pd
 
+from nlhs_tick_data_hungary.network.network_creation import CLRRunner
+from nlhs_tick_data_hungary.network.network_creation import CoOccurrenceEngine
 from nlhs_tick_data_hungary.network.network_creation import CoOccurrenceNetworkPreprocessor
 from nlhs_tick_data_hungary.network.network_creation import GeneralNetworkPreprocessor
 from nlhs_tick_data_hungary.network.network_creation import SparCCRunner
+from nlhs_tick_data_hungary.network.network_creation import SparCCStabilityEngine
 
 
 class NetworkCreator:
     """
     Class for creating a network representation of the winter tick data.
 
-    This class processes tick data, constructs either a SparCC-based network or a co-occurrence network,
-    and stores the result in a network object.
+    This class processes tick data, constructs either a SparCC-based network, a CLR-based network (a cheap screen
+    with the median CLR correlations of Dirichlet replicates) or a co-occurrence network, and stores the result in a
+    network object.
     """
 
     def __init__(self,
@@ -19,7 +24,10 @@ class NetworkCreator:
                  type_of_data: str, convert_to_percentage: bool,
                  year: str, month: str,
                  type_of_network: str,
-                 sparcc_args: dict = None) -> None:
+                 sparcc_args: dict = None,
+                 prefilter_args: dict = None,
+                 preprocessor: GeneralNetworkPreprocessor | None = None,
+                 co_occurrence_engine: CoOccurrenceEngine | None = None) -> None:
         """
         Initialize the NetworkCreator with the specified parameters.
 
@@ -28,8 +36,17 @@ class NetworkCreator:
         :param bool convert_to_percentage: Whether to apply percentage transformations to the data
         :param str year: The year for which the data is being processed (e.g., '2023')
         :param str month: The month for which the data is being processed (e.g., 'January')
-        :param str type_of_network: The type of network to create (e.g., 'SparCC', 'Cooccurrence network')
-        :param dict sparcc_args: Arguments for SparCC algorithm (used only if type_of_network is 'SparCC')
+        :param str type_of_network: The type of network to create (e.g., 'SparCC', 'CLR', 'Cooccurrence network')
+        :param dict sparcc_args: Arguments for SparCC algorithm (used only if type_of_network is 'SparCC' or 'CLR',
+        see `SparCCRunner` and `CLRRunner`). If 'stability' is True, the edge-wise stability frequencies of the
+        SparCC network are also estimated with the jackknife (see `SparCCStabilityEngine`)
+        :param dict prefilter_args: Arguments of the prefilter of the rarely present bacteria ('min_prevalence',
+        'min_total_count', 'top_n_by_variance'), see `TaxaPrefilter`
+        :param GeneralNetworkPreprocessor | None preprocessor: A preprocessor that already selected the data of the
+        type, year and month (e.g. shared by the networks of a `NetworkBatchBuilder`), the data is preprocessed by
+        a new one if not given
+        :param CoOccurrenceEngine | None co_occurrence_engine: An engine that already computed the crosstables of the
+        data (used only if type_of_network is 'Co-occurrence network', see `CoOccurrenceNetworkPreprocessor`)
         """
         self.df = df
         self.type_of_data = type_of_data
@@ -38,10 +55,25 @@ class NetworkCreator:
         self.month = month
         self.type_of_network = type_of_network
         self.sparcc_args = sparcc_args
+        self.prefilter_args = prefilter_args
+        self.preprocessor = preprocessor
+        self.co_occurrence_engine = co_occurrence_engine
 
         self.final_table: pd.DataFrame = pd.DataFrame()  # Dataframe to store processed data
         self.network: nx.Graph = nx.Graph()  # NetworkX object to store created network
 
+        # Result of the SparCC algorithm and its sparse edge list (if 'edge_threshold' or 'top_k' is in `sparcc_args`)
+        self.sparcc_result = None
+        self.node_names: list = []
+        self.edge_list: (dict | None) = None
+
+        # Fraction of the jackknife subsamples where the edges are present (if 'stability' is in `sparcc_args`)
+        self.edge_stability: (pd.DataFrame | None) = None
+
+        # Original positions of the bacteria kept by the prefilter and the statistics of the dropped ones
+        self.kept_taxa_positions: (np.ndarray | None) = None
+        self.dropped_taxa: pd.DataFrame = pd.DataFrame()
+
     def run(self):
         """
         Execute the full data processing pipeline: convert data to a network format, process data (e.g., SparCC or
@@ -55,19 +87,43 @@ class NetworkCreator:
         Preprocess the input data based on the selected network type and transform it into a format suitable for
         network creation.
         """
-        # Preprocess data for networks
-        preprocessor = GeneralNetworkPreprocessor(df=self.df,
-                                                  to_type=self.type_of_data,
-                                                  year=self.year,
-                                                  month=self.month)
+        # Preprocess data for networks (unless it is already done)
+        preprocessor = self.preprocessor
+        if preprocessor is None:
+            preprocessor = GeneralNetworkPreprocessor(df=self.df,
+                                                      to_type=self.type_of_data,
+                                                      year=self.year,
+                                                      month=self.month,
+                                                      prefilter_args=self.prefilter_args)
+        self.kept_taxa_positions = preprocessor.kept_taxa_positions
+        self.dropped_taxa = preprocessor.dropped_taxa
 
         if self.type_of_network == 'SparCC':
-            node_names = list(preprocessor.preprocessed_df.columns)
+            # The bacteria (rows of the preprocessed data) are the nodes of the network
+            node_names = list(preprocessor.preprocessed_df.index)
             # Run SparCC algorithm on the transposed preprocessed data
-            sparcc = SparCCRunner(df=preprocessor.preprocessed_df,
+            sparcc = SparCCRunner(df=preprocessor.preprocessed_df.T,
                                   args=self.sparcc_args)
-            self.final_table = pd.DataFrame(sparcc.run(),
-                                            index=node_names, columns=node_names)
+            self.sparcc_result = sparcc.run()
+
+            self.set_correlation_result(node_names=node_names, correlations=self.sparcc_result.final_result,
+                                        edges=self.sparcc_result.edges)
+
+            if self.sparcc_args.get('stability'):
+                stability_engine = SparCCStabilityEngine(df=preprocessor.preprocessed_df.T,
+                                                         args=self.sparcc_args)
+                stability_engine.run()
+                self.edge_stability = pd.DataFrame(stability_engine.result, index=node_names, columns=node_names)
+
+        elif self.type_of_network == 'CLR':
+            # The bacteria (rows of the preprocessed data) are the nodes of the network
+            node_names = list(preprocessor.preprocessed_df.index)
+            # Median CLR correlations of the Dirichlet replicates of the transposed preprocessed data
+            clr = CLRRunner(df=preprocessor.preprocessed_df.T,
+                            args=self.sparcc_args)
+            clr.run()
+
+            self.set_correlation_result(node_names=node_names, correlations=clr.result, edges=clr.edges)
 
         elif self.type_of_network == 'Co-occurrence network':
             # Preprocess data for co-occurrence network
@@ -76,27 +132,54 @@ class NetworkCreator:
                 type_of_data=self.type_of_data,
                 convert_to_percentage=self.convert_to_percentage,
                 year=self.year,
-                month=self.month
+                month=self.month,
+                co_occurrence_engine=self.co_occurrence_engine
             )
             co_occurrence_preprocessor.run()
             self.final_table = co_occurrence_preprocessor.preprocessed_df
 
+    def set_correlation_result(self, node_names: list, correlations: np.ndarray, edges: dict | None):
+        """
+        Stores the result of a correlation based (SparCC or CLR) network as a sparse edge list or as a table.
+
+        :param list node_names: The names of the nodes (bacteria).
+        :param np.ndarray correlations: The median correlation matrix.
+        :param dict | None edges: The sparse edge list of the correlations, if computed.
+        """
+        if edges is not None:
+            # Use the sparse edge list instead of wrapping the dense median matrix into a DataFrame
+            self.node_names = node_names
+            self.edge_list = edges
+        else:
+            self.final_table = pd.DataFrame(correlations, index=node_names, columns=node_names)
+
     def create_network(self):
         """
         Construct a network based on the processed data stored in `final_table`.
 
         Nodes represent bacteria, and links are weighted based on the values in `final_table`.
-        Only non-zero values are used to create links.
+        Only non-zero, non-missing values are used to create links. If SparCC returned a sparse edge list, the links are
+        created directly from it. The bacteria dropped by the prefilter are listed in the 'dropped_taxa' graph
+        attribute.
         """
-        self.network = nx.Graph()
+        self.network = nx.Graph(dropped_taxa=list(self.dropped_taxa.index))
+
+        if self.edge_list is not None:
+            self.network.add_nodes_from(self.node_names)
+            node_names = np.array(self.node_names, dtype=object)
+            self.network.add_weighted_edges_from(zip(node_names[self.edge_list["row"]],
+                                                     node_names[self.edge_list["col"]],
+                                                     self.edge_list["weight"]))
+            return
 
         # Add nodes to the network for each bacterium
-        for bacterium in self.final_table.columns:
-            self.network.add_node(bacterium)
-
-        # Add links between nodes with weight based on the DataFrame's values
-        for i in range(self.final_table.shape[0]):
-            for j in range(0, i):  # Only consider lower triangle to avoid duplicate links
-                weight = self.final_table.iloc[i, j]
-                if weight != 0:  # Only add links with non-zero weights
-                    self.network.add_edge(self.final_table.index[i], self.final_table.columns[j], weight=weight)
+        self.network.add_nodes_from(self.final_table.columns)
+
+        # Add links between nodes with weight based on the DataFrame's values: only the lower triangle is considered to
+        # avoid duplicate links, and only non-zero, non-missing values are used (in row-major order, like a loop would)
+        weights = self.final_table.to_numpy()
+        mask = np.tril(np.ones(weights.shape, dtype=bool), k=-1) & (weights != 0) & pd.notna(weights)
+        rows, cols = np.nonzero(mask)
+        self.network.add_weighted_edges_from(zip(self.final_table.index[rows],
+                                                 self.final_table.columns[cols],
+                                                 weights[rows, cols]))
@@ -1,2 +1,6 @@
+from nlhs_tick_data_hungary.utils.co_occurrence_kernel import CoOccurrenceKernel
 from nlhs_tick_data_hungary.utils.network_helper import NetworkHelper
+from nlhs_tick_data_hungary.network.network_preparation.co_occurrence_engine import CoOccurrenceEngine
+from nlhs_tick_data_hungary.network.network_preparation.taxa_prefilter import TaxaPrefilter
+from nlhs_tick_data_hungary.network.network_preparation.winter_tick_column_index import WinterTickColumnIndex
 from nlhs_tick_data_hungary.network.network_preparation.general_network_preprocessor import GeneralNetworkPreprocessor
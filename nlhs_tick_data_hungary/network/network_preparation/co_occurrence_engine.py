@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+from nlhs_tick_data_hungary.network.network_preparation import CoOccurrenceKernel
+
+
+class CoOccurrenceEngine:
+    """
+    Computes the co-occurrence crosstables of several slices of the data (sets of samples, e.g. the females of a year
+    and month) with one batched matrix product.
+
+    The samples of every slice are gathered into a zero-padded (slices x bacteria x samples) stack, and the crosstables
+    of every slice are computed at once as a (slices x bacteria x bacteria) tensor. Presence/absence data is stacked
+    as bit-packed words and counted with the popcount kernel of `CoOccurrenceKernel`, other data with a float product.
+    The crosstables of a slice and the differences between two slices (e.g. the females and the males) are only
+    converted into DataFrames (and the differences and their log-ratio variants are only computed) when they are
+    asked for.
+
+    - result (np.ndarray): The crosstables of the slices (in the order of `keys`) with shape (slices, D, D)
+    - keys (list): The keys of the slices
+    """
+
+    # Types of data of the differences between the crosstables of the females and the males
+    difference_types = ['Különbség', 'Nőstény - Hím', 'Hím - Nőstény']
+
+    def __init__(self, df: pd.DataFrame, slices: dict):
+        """
+        Initializes the engine with the data and the slices.
+
+        :param pd.DataFrame df: A DataFrame where rows are the bacteria and columns are the samples
+        :param dict slices: The integer positions of the columns (samples) of every slice, keyed by any hashable key
+        (e.g. the keys of `get_key`)
+        """
+        self.df = df
+        self.slices = slices
+
+        self.keys: list = list(slices)
+        self.result: (np.ndarray | None) = None
+
+    def run(self):
+        """
+        Computes the crosstables of every slice with one batched matrix product.
+        """
+        values = self.df.to_numpy()
+        slice_positions = [np.asarray(self.slices[key], dtype=np.int64) for key in self.keys]
+
+        if CoOccurrenceKernel.is_binary(values=values):
+            # The packed presences of every slice, padded with zero words (absences)
+            packed_slices = [CoOccurrenceKernel.pack(values=values[:, positions]) for positions in slice_positions]
+            max_num_of_words = max([packed.shape[-1] for packed in packed_slices], default=1)
+            stacked_words = np.zeros((len(self.keys), values.shape[0], max_num_of_words), dtype=np.uint64)
+            for slice_index, packed in enumerate(packed_slices):
+                stacked_words[slice_index, :, :packed.shape[-1]] = packed
+
+            self.result = CoOccurrenceKernel.count_joint_presences(packed=stacked_words).astype(float)
+            return
+
+        # The samples of every slice, padded with zeros (absent samples do not change the co-occurrences)
+        values = values.astype(float)
+        max_num_of_samples = max([len(positions) for positions in slice_positions], default=0)
+        stacked_values = np.zeros((len(self.keys), values.shape[0], max_num_of_samples))
+        for slice_index, positions in enumerate(slice_positions):
+            stacked_values[slice_index, :, :len(positions)] = values[:, positions]
+
+        self.result = np.matmul(stacked_values, np.swapaxes(stacked_values, -1, -2))
+
+    def get_subset(self, keys: list) -> 'CoOccurrenceEngine':
+        """
+        Returns an engine holding only the computed crosstables of the given slices (and the bacteria of the data, but
+        not the samples), e.g. to send the crosstables a network needs to a worker process.
+
+        :param list keys: The keys of the slices to keep
+        :return CoOccurrenceEngine: The engine with the crosstables of the slices
+        """
+        subset = CoOccurrenceEngine(df=self.df.iloc[:, :0], slices={key: self.slices[key] for key in keys})
+        subset.result = self.result[[self.keys.index(key) for key in subset.keys]]
+
+        return subset
+
+    @staticmethod
+    def get_key(to_type: str, year: str | list, month: str | list) -> tuple:
+        """
+        Returns the key of the slice of a type of data (gender), year and month.
+
+        :param str to_type: The type of data ('Hímek', 'Nőstények' or 'Összes')
+        :param str | list year: The year filter of the slice
+        :param str | list month: The month filter of the slice
+        :return tuple: The hashable key of the slice
+        """
+        return (to_type,
+                tuple(year) if isinstance(year, list) else year,
+                tuple(month) if isinstance(month, list) else month)
+
+    def get_crosstable(self, key, index: pd.Index | None = None) -> pd.DataFrame:
+        """
+        Returns the crosstable of a slice. The number in the ith row and jth column means how many times the ith AND
+        the jth bacteria was found on the samples of the slice. The diagonal values are NaN.
+
+        :param key: The key of the slice
+        :param pd.Index | None index: The bacteria of the crosstable (e.g. the bacteria kept by a prefilter), every
+        bacterium if not given
+        :return pd.DataFrame: Crosstable DataFrame with NaN on the diagonal
+        """
+        crosstable = self.result[self.keys.index(key)]
+        if index is None:
+            index = self.df.index
+        else:
+            positions = self.df.index.get_indexer(index)
+            crosstable = crosstable[np.ix_(positions, positions)]
+
+        crosstable = crosstable.copy()
+        np.fill_diagonal(crosstable, np.nan)
+
+        return pd.DataFrame(crosstable, index=index, columns=index)
+
+    def get_difference(self, type_of_data: str, female_key, male_key, convert_to_percentage: bool,
+                       epsilon: float = 1e-5, index: pd.Index | None = None) -> pd.DataFrame | None:
+        """
+        Computes one difference between the crosstables of the females and the males (missing values are treated as
+        zeros): the raw difference, or the log-ratio of the crosstables if `convert_to_percentage` is True.
+
+        :param str type_of_data: The type of the difference ('Különbség', 'Nőstény - Hím' or 'Hím - Nőstény')
+        :param female_key: The key of the slice of the females
+        :param male_key: The key of the slice of the males
+        :param bool convert_to_percentage: Whether to compute the log-ratio instead of the raw difference
+        :param float epsilon: A small value to prevent division by zero in the log-ratios
+        :param pd.Index | None index: The bacteria of the crosstables, every bacterium if not given
+        :return pd.DataFrame | None: The difference, or None if the type is not a difference type
+        """
+        if type_of_data not in self.difference_types:
+            return None
+
+        fem_crosstable = self.get_crosstable(key=female_key, index=index).fillna(0)
+        male_crosstable = self.get_crosstable(key=male_key, index=index).fillna(0)
+
+        if convert_to_percentage:
+            if type_of_data == 'Nőstény - Hím':
+                return np.log((fem_crosstable + epsilon) / (male_crosstable + epsilon))
+            log_ratio = np.log((male_crosstable + epsilon) / (fem_crosstable + epsilon))
+            return log_ratio if type_of_data == 'Hím - Nőstény' else abs(log_ratio)
+
+        if type_of_data == 'Hím - Nőstény':
+            return male_crosstable - fem_crosstable
+        difference = fem_crosstable - male_crosstable
+        return difference if type_of_data == 'Nőstény - Hím' else abs(difference)
@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 
+from nlhs_tick_data_hungary.network.network_preparation import CoOccurrenceEngine
 from nlhs_tick_data_hungary.network.network_preparation import NetworkHelper
 
 
@@ -19,7 +20,8 @@ class CoOccurrenceNetworkPreprocessor:
     - preprocessed_df (DataFrame): The final preprocessed DataFrame based on the type of data.
     """
 
-    def __init__(self, df: pd.DataFrame, type_of_data: str, convert_to_percentage: bool, year: str, month: str):
+    def __init__(self, df: pd.DataFrame, type_of_data: str, convert_to_percentage: bool, year: str, month: str,
+                 co_occurrence_engine: CoOccurrenceEngine | None = None):
         """
         Initializes the CooccurenceNetworkPreprocessor with provided data and parameters.
 
@@ -28,12 +30,16 @@ class CoOccurrenceNetworkPreprocessor:
         :param bool convert_to_percentage: Indicates if the output should be in percentage.
         :param str year: The year for which the data is being processed (e.g., '2023')
         :param str month: The month for which the data is being processed (e.g., 'January')
+        :param CoOccurrenceEngine | None co_occurrence_engine: An engine that already computed the crosstables of the
+        slices of the type, year and month (see `CoOccurrenceEngine.get_key`), e.g. shared by the networks of a
+        `NetworkBatchBuilder`. The crosstables are computed by a new engine if not given.
         """
         self.df = df
         self.type_of_data = type_of_data
         self.convert_to_percentage = convert_to_percentage
         self.year = year
         self.month = month
+        self.co_occurrence_engine = co_occurrence_engine
 
         self.num_of_samples = self.df.shape[1]
         self.epsilon: float = 1e-5  # Small value to prevent division by zero
@@ -50,45 +56,51 @@ class CoOccurrenceNetworkPreprocessor:
     def create_crosstable_based_on_type_of_data(self):
         """
         Creates crosstables for male and female data based on the preprocessed data to calculate the differences between
-        male and female data if applicable.
+        male and female data if applicable. Only the difference of the type of data is calculated.
         """
         # If the type is either 'Nőstények', 'Hímek', or 'Összes', then the previous preprocessing
         # (GeneralNetworkPreprocessing) in the NetworkCreator class already selected the type so
         # no further transformation needed
         if self.type_of_data in ['Nőstények', 'Hímek', 'Összes']:
-            self.preprocessed_df = NetworkHelper.create_crosstable(df=self.df)
+            engine = self.get_co_occurrence_engine(types=[self.type_of_data])
+            self.preprocessed_df = engine.get_crosstable(
+                key=CoOccurrenceEngine.get_key(to_type=self.type_of_data, year=self.year, month=self.month),
+                index=self.df.index
+            )
 
         if self.type_of_data in ['Különbség', 'Nőstény - Hím', 'Hím - Nőstény']:
-            # Load data for both genders to calculate differences
-            fem_df = NetworkHelper.select_type(df=self.df,
-                                               to_type='Nőstények')
-            male_df = NetworkHelper.select_type(df=self.df,
-                                                to_type='Hímek')
-
-            # Create crosstables for female and male data and fill missing values with zero
-            fem_crosstable, male_crosstable = map(
-                lambda df: NetworkHelper.create_crosstable(df).fillna(0), [fem_df, male_df]
+            # Crosstables of both genders (computed at once) to calculate differences
+            engine = self.get_co_occurrence_engine(types=['Nőstények', 'Hímek'])
+            self.preprocessed_df = engine.get_difference(
+                type_of_data=self.type_of_data,
+                female_key=CoOccurrenceEngine.get_key(to_type='Nőstények', year=self.year, month=self.month),
+                male_key=CoOccurrenceEngine.get_key(to_type='Hímek', year=self.year, month=self.month),
+                convert_to_percentage=self.convert_to_percentage,
+                epsilon=self.epsilon,
+                index=self.df.index
             )
 
-            # Define operations for calculating differences (to avoid so many 'if' operations)
-            diff_calc_operations = {
-                'Nőstény - Hím': fem_crosstable - male_crosstable,
-                'Hím - Nőstény': male_crosstable - fem_crosstable,
-                'Különbség': abs(fem_crosstable - male_crosstable)
-            }
-
-            # Define operations for calculating differences in percentage (to avoid so many 'if' operations)
-            diff_calc_operations_percentage = {
-                'Hím - Nőstény': np.log((male_crosstable + self.epsilon) / (fem_crosstable + self.epsilon)),
-                'Nőstény - Hím': np.log((fem_crosstable + self.epsilon) / (male_crosstable + self.epsilon)),
-                'Különbség': abs(np.log((male_crosstable + self.epsilon) / (fem_crosstable + self.epsilon)))
-            }
-
-            # Select the appropriate calculation based on whether to convert to percentage
-            if self.convert_to_percentage:
-                self.preprocessed_df = diff_calc_operations_percentage.get(self.type_of_data, None)
-            else:
-                self.preprocessed_df = diff_calc_operations.get(self.type_of_data, None)
+    def get_co_occurrence_engine(self, types: list) -> CoOccurrenceEngine:
+        """
+        Returns the shared co-occurrence engine, or computes the crosstables of the types of the data with a new one.
+
+        :param list types: The types of data (genders) whose crosstables are needed
+        :return CoOccurrenceEngine: The engine with the computed crosstables
+        """
+        if self.co_occurrence_engine is not None:
+            return self.co_occurrence_engine
+
+        # The type of the data is already selected, so the slice of a single type contains every column
+        slices = {
+            CoOccurrenceEngine.get_key(to_type=to_type, year=self.year, month=self.month):
+                NetworkHelper.get_type_positions(columns=self.df.columns,
+                                                 to_type='Összes' if to_type == self.type_of_data else to_type)
+            for to_type in types
+        }
+        engine = CoOccurrenceEngine(df=self.df, slices=slices)
+        engine.run()
+
+        return engine
 
     def apply_percentage(self):
         """
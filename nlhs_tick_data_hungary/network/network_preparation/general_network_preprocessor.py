@@ -1,6 +1,10 @@
+import copy
+
+import numpy as np
 import pandas as pd
 
-from nlhs_tick_data_hungary.network.network_preparation import NetworkHelper
+from nlhs_tick_data_hungary.network.network_preparation import TaxaPrefilter
+from nlhs_tick_data_hungary.network.network_preparation import WinterTickColumnIndex
 
 
 class GeneralNetworkPreprocessor:
@@ -8,60 +12,102 @@ class GeneralNetworkPreprocessor:
     Prepares a pandas DataFrame for network processing by selecting relevant data and structuring it by time.
 
     - preprocessed_df (pd.DataFrame): The preprocessed DataFrame (with selected type and time)
+    - kept_taxa_positions (np.ndarray): The original positions of the rows (bacteria) kept by the prefilter
+    - dropped_taxa (pd.DataFrame): The bacteria dropped by the prefilter with their statistics and the reason
     """
 
-    def __init__(self, df: pd.DataFrame, to_type: str, year: str, month: str):
+    def __init__(self, df: pd.DataFrame, to_type: str, year: str | list, month: str | list,
+                 prefilter_args: dict | None = None, is_numeric: bool = False,
+                 column_index: WinterTickColumnIndex | None = None):
         """
         Initializes the preprocessor with a DataFrame and filtering parameters.
 
         :param pd.DataFrame df: The input DataFrame containing raw data
         :param str to_type: The type of data to select
-        :param str year: The year filter, or an empty string to select all years
-        :param str year: The month filter, or an empty string to select all months
+        :param str | list year: The year filter (a year or a list of years), or an empty string to select all years
+        :param str | list month: The month filter (a month or a list of months, e.g. a range of months from
+        `WinterTickColumnIndex.get_month_range`), or an empty string to select all months
+        :param dict | None prefilter_args: Arguments of the `TaxaPrefilter` ('min_prevalence', 'min_total_count',
+        'top_n_by_variance'), no bacteria are filtered out if not given
+        :param bool is_numeric: Whether the input DataFrame is already numeric (e.g. when it is shared by several
+        preprocessors, see `convert_to_numeric`), its contiguous columns are selected as views then
+        :param WinterTickColumnIndex | None column_index: The index of the columns of the input DataFrame (e.g. when it
+        is shared by several preprocessors), it is built from the columns if not given
         """
         self.df = df
         self.to_type = to_type
         self.year = year
         self.month = month
+        self.prefilter_args = prefilter_args
+        self.is_numeric = is_numeric
+        self.column_index = column_index if column_index is not None else WinterTickColumnIndex(columns=df.columns)
 
         self.preprocessed_df: pd.DataFrame = pd.DataFrame()
+        self.kept_taxa_positions: np.ndarray = np.arange(self.df.shape[0])
+        self.dropped_taxa: pd.DataFrame = pd.DataFrame(columns=['prevalence', 'total_count', 'variance', 'reason'])
+
+        # Select the columns of the type (gender category) and the time
+        self.select_columns()
 
-        # Select data based on type (gender category)
-        self.select_type_of_data()
+        # Drop the rarely present or low-abundance bacteria
+        if self.prefilter_args is not None:
+            self.prefilter_taxa()
+
+    def select_columns(self) -> None:
+        """
+        Selects the columns of the specified type (e.g., 'Male', 'Female'), year and month by their positions, and
+        converts the values to numeric format where applicable. If neither the year nor the month is specified, the
+        columns keep their full labels, otherwise only their 'Gender' labels are kept.
+        """
+        positions = self.column_index.get_positions(to_type=self.to_type, year=self.year, month=self.month)
+        labels = self.column_index.get_labels(positions=positions, year=self.year, month=self.month)
+
+        if self.is_numeric:
+            # Select the columns of the numeric values (a view if the columns are contiguous)
+            values = self.df.to_numpy()[:, WinterTickColumnIndex.to_selector(positions=positions)]
+            self.preprocessed_df = pd.DataFrame(values, index=self.df.index, columns=labels, copy=False)
+        else:
+            self.preprocessed_df = GeneralNetworkPreprocessor.convert_to_numeric(df=self.df.iloc[:, positions])
+            self.preprocessed_df.columns = labels
 
-        # Prepare DataFrame by structuring it with time-based indexing
-        self.prepare_dataframe_by_time()
+    def detach(self) -> 'GeneralNetworkPreprocessor':
+        """
+        Returns a copy of the preprocessor holding only the data of its slice: the preprocessed data replaces the input
+        data and the column index is dropped, e.g. to send it to a worker process without the full data.
 
-    def select_type_of_data(self):
+        :return GeneralNetworkPreprocessor: The detached preprocessor
         """
-        Filters the DataFrame based on the specified type (e.g., 'Male', 'Female').
-        Converts values to numeric format where applicable.
+        detached = copy.copy(self)
+        detached.df = self.preprocessed_df
+        detached.column_index = None
+
+        return detached
+
+    @staticmethod
+    def convert_to_numeric(df: pd.DataFrame, as_single_array: bool = False) -> pd.DataFrame:
         """
-        self.df = NetworkHelper.select_type(df=self.df, to_type=self.to_type)
+        Converts the values of the DataFrame to numeric format where applicable.
 
+        :param pd.DataFrame df: The input DataFrame containing raw data
+        :param bool as_single_array: Whether to store the values in a single NumPy array (of their common type), so
+        that the columns can be selected as views
+        :return pd.DataFrame: The numeric DataFrame
+        """
         # Convert the DataFrame values to numeric integers where possible
-        self.df = self.df.apply(pd.to_numeric, errors='coerce', downcast='integer')
+        numeric_df = df.apply(pd.to_numeric, errors='coerce', downcast='integer')
+        if as_single_array:
+            numeric_df = pd.DataFrame(numeric_df.to_numpy(), index=df.index, columns=df.columns)
+
+        return numeric_df
 
-    def prepare_dataframe_by_time(self) -> None:
+    def prefilter_taxa(self) -> None:
         """
-        Method for filtering data based on specified year and month values.
+        Filters out the bacteria (rows) of the preprocessed DataFrame with the `TaxaPrefilter` and records the
+        positions of the kept bacteria and the statistics of the dropped ones.
         """
+        prefilter = TaxaPrefilter(df=self.preprocessed_df, **self.prefilter_args)
+        prefilter.run()
 
-        if self.year == '' and self.month == '':
-            self.preprocessed_df = self.df
-            return
-
-        # Filter based on available year-month combinations if only the month is specified
-        if self.year == '' and self.month != '':
-            available_combs = [y for y in ['2022', '2023'] if (y, self.month) in self.df.columns]
-            self.preprocessed_df = pd.concat([self.df[(y, self.month)] for y in available_combs], axis=1)
-
-        # Filter based on available months if only the year is specified
-        elif self.year != '' and self.month == '':
-            self.preprocessed_df = pd.concat(
-                [self.df[(self.year, m)] for m in ['January', 'October', 'November', 'December'] if
-                 (self.year, m) in self.df.columns], axis=1
-            )
-        else:
-            # Select data for the specified year and month
-            self.preprocessed_df = self.df[(self.year, self.month)]
+        self.preprocessed_df = prefilter.result
+        self.kept_taxa_positions = prefilter.kept_positions
+        self.dropped_taxa = prefilter.dropped_taxa
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+
+class TaxaPrefilter:
+    """
+    Filters out the rarely present or low-abundance bacteria (rows) of the data before the network is created.
+
+    A bacterium is kept if it is present (non-zero) in at least `min_prevalence` fraction of the samples (columns),
+    its total count is at least `min_total_count`, and (if `top_n_by_variance` is given) it is among the most variable
+    bacteria of the remaining ones. The dropped bacteria are reported with their statistics and the reason of the
+    exclusion, so they do not silently vanish from the network.
+
+    - result (pd.DataFrame): The filtered DataFrame (kept rows in their original order)
+    - kept_positions (np.ndarray): The original positions of the kept rows (the position of the ith kept row)
+    - dropped_taxa (pd.DataFrame): The statistics ('prevalence', 'total_count', 'variance') and the 'reason' of every
+      dropped bacterium
+    """
+
+    def __init__(self, df: pd.DataFrame, min_prevalence: float = 0.0, min_total_count: float = 0.0,
+                 top_n_by_variance: int | None = None):
+        """
+        Initializes the prefilter with the data and the filtering parameters.
+
+        :param pd.DataFrame df: The DataFrame containing the bacteria in the rows and the samples in the columns
+        :param float min_prevalence: The minimal fraction of the samples (between 0 and 1) where a bacterium is present
+        :param float min_total_count: The minimal total count of a bacterium over the samples
+        :param int | None top_n_by_variance: The number of the most variable bacteria to keep (all if not given)
+        """
+        self.df = df
+        self.min_prevalence = min_prevalence
+        self.min_total_count = min_total_count
+        self.top_n_by_variance = top_n_by_variance
+
+        self.result: pd.DataFrame = pd.DataFrame()
+        self.kept_positions: np.ndarray = np.array([], dtype=np.int64)
+        self.dropped_taxa: pd.DataFrame = pd.DataFrame(columns=['prevalence', 'total_count', 'variance', 'reason'])
+
+    def run(self):
+        """
+        Calculates the statistics of the bacteria and filters the DataFrame.
+        """
+        values = self.df.fillna(0).to_numpy(dtype=float)
+
+        statistics = pd.DataFrame({
+            'prevalence': (values > 0).mean(axis=1) if values.shape[1] > 0 else np.zeros(values.shape[0]),
+            'total_count': values.sum(axis=1),
+            'variance': values.var(axis=1, ddof=1) if values.shape[1] > 1 else np.zeros(values.shape[0])
+        }, index=self.df.index)
+
+        # The first failed criterion is the reason of the exclusion
+        reasons = pd.Series(None, index=self.df.index, dtype=object)
+        reasons[(statistics['total_count'] < self.min_total_count).to_numpy()] = 'total_count'
+        reasons[(statistics['prevalence'] < self.min_prevalence).to_numpy()] = 'prevalence'
+
+        if self.top_n_by_variance is not None:
+            remaining_positions = np.flatnonzero(reasons.isna().to_numpy())
+            # Stable sort, so ties keep the original order of the rows
+            order = np.argsort(-statistics['variance'].to_numpy()[remaining_positions], kind='stable')
+            reasons.iloc[remaining_positions[order[self.top_n_by_variance:]]] = 'variance'
+
+        kept = reasons.isna().to_numpy()
+        self.kept_positions = np.flatnonzero(kept)
+        self.result = self.df.iloc[self.kept_positions]
+        self.dropped_taxa = statistics[~kept].assign(reason=reasons[~kept].to_numpy())
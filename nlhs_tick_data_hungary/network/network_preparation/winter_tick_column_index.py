@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+
+class WinterTickColumnIndex:
+    """
+    An index over the ('Year', 'Month', 'Gender') MultiIndex columns of the winter tick data for selecting the columns
+    of a type of data (gender), years and months by integer positions.
+
+    The levels of the columns are encoded once, so a query is a few vectorized comparisons instead of substring
+    filtering and probing hard-coded year-month tuples. The years and the months are taken from the columns (new
+    seasons need no code changes); the selected columns are ordered chronologically by year, then by calendar month,
+    then by their original order. If the selected positions are contiguous, the selection is a slice, so slicing a
+    NumPy array with it returns a view (no copy).
+
+    - years (list): The years of the columns (sorted)
+    - months (list): The months of the columns (in calendar order)
+    """
+
+    # Months in calendar order (the months of the columns not listed here are ordered after them)
+    calendar_months = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
+                       'October', 'November', 'December']
+
+    def __init__(self, columns: pd.MultiIndex):
+        """
+        Initializes the index with the columns of the winter tick data.
+
+        :param pd.MultiIndex columns: The columns with the 'Year', 'Month' and 'Gender' levels
+        """
+        self.columns = columns
+
+        year_labels = columns.get_level_values(0).astype(str)
+        month_labels = columns.get_level_values(1).astype(str)
+        gender_labels = columns.get_level_values(2).astype(str)
+
+        self.years: list = sorted(year_labels.unique())
+        self.months: list = sorted(month_labels.unique(), key=self.get_month_rank)
+
+        # Rank of the year and the month of every column
+        self.year_ranks: np.ndarray = np.array([self.years.index(year) for year in year_labels], dtype=np.int64)
+        self.month_ranks: np.ndarray = np.array([self.months.index(month) for month in month_labels], dtype=np.int64)
+
+        # Columns of every type of data (gender), computed once
+        self.type_masks: dict = {
+            'Hímek': np.array(['Male' in gender for gender in gender_labels], dtype=bool),
+            'Nőstények': np.array(['Female' in gender for gender in gender_labels], dtype=bool)
+        }
+
+    def get_month_rank(self, month: str) -> int:
+        """
+        Returns the position of a month in the calendar (months not in the calendar are ordered after December).
+
+        :param str month: The name of the month
+        :return int: The position of the month
+        """
+        if month in self.calendar_months:
+            return self.calendar_months.index(month)
+
+        return len(self.calendar_months)
+
+    @classmethod
+    def get_month_range(cls, start: str, end: str) -> list:
+        """
+        Returns the calendar months from `start` to `end` (both included). The range wraps around the end of the
+        year if `end` is before `start` (e.g. 'October' - 'January' is the winter season).
+
+        :param str start: The first month of the range
+        :param str end: The last month of the range
+        :return list: The months of the range
+        """
+        start_position = cls.calendar_months.index(start)
+        end_position = cls.calendar_months.index(end)
+        if end_position >= start_position:
+            return cls.calendar_months[start_position:end_position + 1]
+
+        return cls.calendar_months[start_position:] + cls.calendar_months[:end_position + 1]
+
+    def get_positions(self, to_type: str = 'Összes', year: str | list = '', month: str | list = '') -> np.ndarray:
+        """
+        Returns the integer positions of the columns of a type of data, years and months.
+
+        :param str to_type: The type of data - 'Hímek' (Males), 'Nőstények' (Females), the other types select every
+        column
+        :param str | list year: A year, a list of years, or an empty string to select every year
+        :param str | list month: A month, a list of months (e.g. from `get_month_range`), or an empty string to select
+        every month
+        :return np.ndarray: The positions of the selected columns (in their original order if neither the year nor the
+        month is specified, ordered by year, month and original position otherwise)
+
+        A ValueError is raised if a queried year or month is not in the columns, or if a single year and month do not
+        select an existing year-month pair (like selecting a missing pair of the MultiIndex).
+        """
+        mask = self.type_masks.get(to_type, np.ones(len(self.columns), dtype=bool)).copy()
+        if year != '':
+            year_ranks = self.get_ranks(values=self.years, query=year, level='year')
+            mask &= np.isin(self.year_ranks, year_ranks)
+        if month != '':
+            # The calendar months of a month range without columns are skipped (e.g. the summer months of a range)
+            if not isinstance(month, str):
+                month = [value for value in month if value in self.months or value not in self.calendar_months]
+            month_ranks = self.get_ranks(values=self.months, query=month, level='month')
+            mask &= np.isin(self.month_ranks, month_ranks)
+
+        # A single year and month select a year-month pair of the columns, which has to exist
+        if isinstance(year, str) and isinstance(month, str) and year != '' and month != '':
+            if not np.any((self.year_ranks == year_ranks[0]) & (self.month_ranks == month_ranks[0])):
+                raise ValueError(f"The columns have no ('{year}', '{month}') year-month pair.")
+
+        positions = np.flatnonzero(mask)
+        if year == '' and month == '':
+            return positions
+
+        # Chronological order of the selected columns (stable within the same year and month)
+        return positions[np.lexsort((positions, self.month_ranks[positions], self.year_ranks[positions]))]
+
+    @staticmethod
+    def get_ranks(values: list, query: str | list, level: str = 'value') -> list:
+        """
+        Returns the ranks of the queried values. A ValueError is raised if a queried value is not in the columns.
+
+        :param list values: The sorted values of a level
+        :param str | list query: A value or a list of values
+        :param str level: The name of the level in the error message (e.g. 'year' or 'month')
+        :return list: The ranks of the queried values
+        """
+        query = [query] if isinstance(query, str) else query
+        unknown_values = [value for value in query if value not in values]
+        if unknown_values:
+            raise ValueError(f"Unknown {level}: {', '.join(map(str, unknown_values))} (the columns have "
+                             f"{', '.join(values)}).")
+
+        return [values.index(value) for value in query]
+
+    @staticmethod
+    def to_selector(positions: np.ndarray) -> slice | np.ndarray:
+        """
+        Converts the positions to a slice if they are contiguous, so that selecting them returns a view.
+
+        :param np.ndarray positions: The positions of the columns
+        :return slice | np.ndarray: A slice of the contiguous positions, or the positions otherwise
+        """
+        if len(positions) == 0:
+            return slice(0, 0)
+        if np.array_equal(positions, np.arange(positions[0], positions[0] + len(positions))):
+            return slice(int(positions[0]), int(positions[0]) + len(positions))
+
+        return positions
+
+    def get_labels(self, positions: np.ndarray, year: str | list = '', month: str | list = '') -> pd.Index:
+        """
+        Returns the labels of the selected columns: the 'Gender' labels if the year or the month is specified (like
+        selecting a year-month pair of the columns), the full labels otherwise.
+
+        :param np.ndarray positions: The positions of the selected columns
+        :param str | list year: The year query of the selection
+        :param str | list month: The month query of the selection
+        :return pd.Index: The labels of the selected columns
+        """
+        labels = self.columns[positions]
+        if year == '' and month == '':
+            return labels
+
+        return labels.get_level_values(2)
@@ -1,5 +1,7 @@
 from nlhs_tick_data_hungary.network.sparcc.basis_variance_calculator import BasisVarianceCalculator
 from nlhs_tick_data_hungary.network.sparcc.correlation_calculator import CorrelationCalculator
+from nlhs_tick_data_hungary.network.sparcc.dirichlet_resampler import DirichletResampler
+from nlhs_tick_data_hungary.network.sparcc.helper_matrix_solver import HelperMatrixSolver
 from nlhs_tick_data_hungary.network.sparcc.log_ratio_variance_calculator import LogRatioVarianceCalculator
 from nlhs_tick_data_hungary.network.sparcc.sparcc_result import SparCCResult
 from nlhs_tick_data_hungary.network.sparcc.strongly_correlated_pair_handler import StronglyCorrelatedPairHandler
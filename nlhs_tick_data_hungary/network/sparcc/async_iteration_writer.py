@@ -0,0 +1,74 @@
+import queue
+import threading
+import typing
+
+
+class AsyncIterationWriter:
+    """
+    A class for writing the artifacts of the SparCC iterations in a background thread.
+
+    The write tasks are put into a bounded queue and executed in order by a single writer thread, so the next
+    iteration can be computed while the previous one is written. If the writer falls behind, `submit` blocks until
+    there is free space in the queue (backpressure). `close` waits until every submitted task is finished.
+    """
+
+    def __init__(self, max_queue_size: int = 4):
+        """
+        Initializes the writer and starts the writer thread.
+
+        :param int max_queue_size: The maximal number of pending write tasks.
+        """
+        self.tasks: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        # The first exception raised by a write task
+        self.error: (BaseException | None) = None
+
+        self.thread = threading.Thread(target=self.write_tasks, name='SparCC-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, function: typing.Callable, *args, **kwargs):
+        """
+        Submits a write task. Blocks while the queue is full.
+
+        :param Callable function: The function that writes the artifacts.
+        :param args: Positional arguments of the function.
+        :param kwargs: Keyword arguments of the function.
+        """
+        self.raise_error()
+        self.tasks.put((function, args, kwargs))
+
+    def write_tasks(self):
+        """
+        Executes the submitted tasks in order until the closing sentinel (None) arrives.
+        After an error, the remaining tasks are skipped.
+        """
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+
+            function, args, kwargs = task
+            if self.error is None:
+                try:
+                    function(*args, **kwargs)
+                except BaseException as error:
+                    self.error = error
+
+    def close(self, raise_error: bool = True):
+        """
+        Waits until every submitted task is written and stops the writer thread.
+        Raises the error of a failed write task, if any.
+
+        :param bool raise_error: Whether to raise the error of a failed write task (False when the caller is already
+        unwinding with another exception, which the error would replace).
+        """
+        self.tasks.put(None)
+        self.thread.join()
+        if raise_error:
+            self.raise_error()
+
+    def raise_error(self):
+        """
+        Raises the error of a failed write task, if any.
+        """
+        if self.error is not None:
+            raise RuntimeError("Writing the SparCC iteration artifacts failed.") from self.error
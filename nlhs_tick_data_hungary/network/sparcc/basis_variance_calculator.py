@@ -1,23 +1,34 @@
 import numpy as np
 import pandas as pd
 
+from nlhs_tick_data_hungary.network.sparcc.helper_matrix_solver import HelperMatrixSolver
+
 
 class BasisVarianceCalculator:
     """
     A class for calculating the basis variances based on the log-ratio variances.
     """
-    def __init__(self, log_ratio_variance: np.ndarray, helper_matrix: np.ndarray):
+    def __init__(self, log_ratio_variance: np.ndarray, helper_matrix: np.ndarray | None,
+                 helper_matrix_solver: HelperMatrixSolver | None = None, tile_size: int | None = None):
         """
        Initializes the basis variance calculator with input data, a helper matrix,
         and a copy of variances of log-ratios.
 
-       :param np.ndarray log_ratio_variance: A matrix containing the log-ratio variances between OTUs.
-       :param np.ndarray helper_matrix: A matrix used for tracking exclusions and modifications.
+       :param np.ndarray log_ratio_variance: A matrix containing the log-ratio variances between OTUs
+       (or a stack of such matrices of several iterations).
+       :param np.ndarray | None helper_matrix: A matrix used for tracking exclusions and modifications.
+       :param HelperMatrixSolver | None helper_matrix_solver: A solver tracking the same modifications as the helper
+       matrix. If given, it is used instead of the Moore-Penrose inverse of the helper matrix.
+       :param int | None tile_size: If given, the log-ratio variances (of a single matrix) are summed in tiles of this
+       many rows (for memory-mapped matrices).
        """
         # Array containing the log-ratio variances (often referenced as variation matrix, or T matrix)
         self.log_ratio_variance = log_ratio_variance
         # Helper matrix (M)
         self.helper_matrix = helper_matrix
+        # Solver exploiting the structure of the helper matrix
+        self.helper_matrix_solver = helper_matrix_solver
+        self.tile_size = tile_size
 
         # Attribute to store the basis variances
         self.result: (pd.DataFrame | None) = None
@@ -37,12 +48,35 @@ class BasisVarianceCalculator:
         matrix, x is the matrix containing the basis variances and b is the
         sum of columns of the log-ratio variances (t_i). We can solve the equation if we multiply the equation
         with the inverse of A from the left (x = M^{-1} \cdot b).
+
+        If a `HelperMatrixSolver` is available, the equation is solved with the closed-form inverse of the initial
+        helper matrix and low-rank updates instead of computing the inverse of the helper matrix.
+
+        For a stack of log-ratio variance matrices, the basis variances of every iteration are solved at once
+        (the rows of the result belong to the iterations).
+
+        The equation is always solved in float64 (the sums of the columns are also accumulated in float64), since
+        the subtraction of the low-rank updates is sensitive to rounding. The result gets the floating point type of
+        the log-ratio variances.
         """
-        # Calculating the inverse of the helper matrix (M) with the Moore-Penrose inverse
-        helper_matrix_inv = np.linalg.pinv(self.helper_matrix)
-        # Multiplying the sum of the columns of the log-ratio variances with
-        # the inverse of the helper matrix from the left
-        self.result = np.dot(helper_matrix_inv, self.log_ratio_variance.sum(axis=1))
+        # Sum of the columns of the log-ratio variances (one row per iteration in case of a stack)
+        if self.tile_size is None:
+            component_variations = self.log_ratio_variance.sum(axis=-1, dtype=np.float64)
+        else:
+            component_variations = np.concatenate([
+                self.log_ratio_variance[start:start + self.tile_size].sum(axis=-1, dtype=np.float64)
+                for start in range(0, self.log_ratio_variance.shape[0], self.tile_size)
+            ])
+
+        if self.helper_matrix_solver is not None:
+            self.result = self.helper_matrix_solver.solve(component_variations.T).T
+        else:
+            # Calculating the inverse of the helper matrix (M) with the Moore-Penrose inverse
+            helper_matrix_inv = np.linalg.pinv(self.helper_matrix)
+            # Multiplying the sum of the columns of the log-ratio variances with
+            # the inverse of the helper matrix from the left
+            self.result = np.dot(helper_matrix_inv, component_variations.T).T
+        self.result = self.result.astype(self.log_ratio_variance.dtype, copy=False)
 
         # If any value is less than zero, replace it with a small number
         self.result[self.result <= 0] = 1e-6
@@ -0,0 +1,42 @@
+import collections
+from concurrent.futures import Executor
+import itertools
+import typing
+
+
+class BatchSubmitter:
+    """
+    A class for submitting batches of work to an executor with a bounded number of pending batches.
+
+    `Executor.map` submits every batch up front, so the queued batches (and their pickled arguments) of a long run are
+    all kept by the executor, and a run that stops early leaves them queued on a shared executor. The batches are
+    submitted lazily instead: at most `max_pending_batches` batches are pending at a time, and the next batch is
+    submitted when the result of the oldest one is consumed.
+    """
+
+    @staticmethod
+    def submit_batches(executor: Executor, function: typing.Callable, batches: list,
+                       max_pending_batches: int) -> typing.Iterator:
+        """
+        Submits the batches to an executor lazily. If the iteration over the results is stopped (or fails), the
+        pending batches are cancelled.
+
+        :param Executor executor: The executor running the batches.
+        :param Callable function: The function applied to every batch.
+        :param list batches: The batches.
+        :param int max_pending_batches: The maximal number of submitted batches whose results are not consumed yet.
+        :return Iterator: An iterator over the results of the batches, in the order of the batches.
+        """
+        remaining_batches = iter(batches)
+        pending = collections.deque(executor.submit(function, batch)
+                                    for batch in itertools.islice(remaining_batches, max(1, max_pending_batches)))
+        try:
+            while pending:
+                batch_result = pending.popleft().result()
+                for batch in itertools.islice(remaining_batches, 1):
+                    pending.append(executor.submit(function, batch))
+                yield batch_result
+        finally:
+            # The batches that are not started yet are not needed if the iterations were stopped
+            for future in pending:
+                future.cancel()
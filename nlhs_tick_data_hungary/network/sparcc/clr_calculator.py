@@ -4,15 +4,21 @@ import numpy as np
 class CLRCalculator:
     """
     A class to perform Centered Log-Ratio (CLR) transformation and compute correlation coefficients.
+
+    The logarithm is taken after adding a pseudo-count to the data (1 by default, to avoid log(0) for counts). Every
+    method uses the same transformation, log(x + pseudo_count); strictly positive data (e.g. Dirichlet fractions) can
+    be transformed without a pseudo-count by passing 0.
     """
 
-    def __init__(self, data: np.ndarray):
+    def __init__(self, data: np.ndarray, pseudo_count: float = 1):
         """
         Initializes the CLRCalculator with the given data.
 
         :param np.ndarray data (np.ndarray): A NumPy array containing the input data.
+        :param float pseudo_count: The value added to the data before the logarithm.
         """
         self.data = data.T
+        self.pseudo_count = pseudo_count
 
     def run(self) -> np.ndarray:
         """
@@ -35,6 +41,29 @@ class CLRCalculator:
 
         return correlations
 
+    def run_clr_tiled(self, out: np.ndarray, tile_size: int) -> np.ndarray:
+        """
+        Computes the correlation matrix of the CLR-transformed data like `run_clr`, but into the given (e.g.
+        memory-mapped) matrix row tile by row tile, so no dense D x D temporary is allocated.
+
+        :param np.ndarray out: The D x D matrix the correlations are written into.
+        :param int tile_size: The number of rows computed at once.
+        :return np.ndarray: The correlation matrix (out).
+        """
+        z = self.calc_clr()
+
+        # Covariances and standard deviations of the components (normalised like `np.corrcoef`)
+        z -= z.mean(axis=1, keepdims=True)
+        standard_deviations = np.sqrt(np.einsum('ij,ij->i', z, z) / (z.shape[1] - 1))
+        for start in range(0, z.shape[0], tile_size):
+            stop = min(start + tile_size, z.shape[0])
+            tile = np.dot(z[start:stop], z.T) / (z.shape[1] - 1)
+            tile /= standard_deviations[start:stop, np.newaxis]
+            tile /= standard_deviations[np.newaxis, :]
+            out[start:stop] = np.clip(tile, -1, 1)
+
+        return out
+
     def calc_clr(self) -> np.ndarray:
         """
         Performs Centered Log-Ratio (CLR) transformation on the dataset.
@@ -42,10 +71,43 @@ class CLRCalculator:
         :return np.ndarray: CLR-transformed dataset.
         """
 
-        # Apply log transformation after adding 1 to avoid log(0)
-        log_data = np.array(np.log(self.data + 1))
+        # Apply log transformation after adding the pseudo-count to avoid log(0)
+        log_data = np.array(np.log(self.data + self.pseudo_count))
 
         # Compute mean across columns (features)
         mean = np.mean(log_data, axis=0, keepdims=True)
 
         return log_data - mean
+
+    @staticmethod
+    def run_clr_batch(data: np.ndarray, pseudo_count: float = 1) -> np.ndarray:
+        """
+        Computes the correlation matrices of the CLR-transformed data of a stack of datasets at once.
+
+        The CLR transformation (the same as `calc_clr`), the centering and the covariances of every dataset are
+        computed with single vectorized calls (the covariances with one stacked matrix product), then normalised like
+        `np.corrcoef`.
+
+        :param np.ndarray data: A stack of datasets with shape (datasets, samples, components).
+        :param float pseudo_count: The value added to the data before the logarithm.
+        :return np.ndarray: The correlation matrices of the CLR-transformed datasets with shape
+        (datasets, components, components).
+        """
+        num_of_samples = data.shape[-2]
+
+        # CLR transformation: log(x + pseudo_count) centered by the mean of the components of every sample
+        z = data + pseudo_count
+        np.log(z, out=z)
+        z -= z.mean(axis=-1, keepdims=True)
+
+        # Covariances of the components across the samples of every dataset
+        z -= z.mean(axis=-2, keepdims=True)
+        correlations = np.matmul(np.swapaxes(z, -1, -2), z) / (num_of_samples - 1)
+
+        # Normalise the covariances by the standard deviations (like `np.corrcoef`)
+        standard_deviations = np.sqrt(np.einsum('nii->ni', correlations))
+        correlations /= standard_deviations[:, :, np.newaxis]
+        correlations /= standard_deviations[:, np.newaxis, :]
+        np.clip(correlations, -1, 1, out=correlations)
+
+        return correlations
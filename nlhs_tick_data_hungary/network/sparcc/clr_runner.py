@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from nlhs_tick_data_hungary.network.sparcc.clr_calculator import CLRCalculator
+from nlhs_tick_data_hungary.network.sparcc.correlation_aggregator import CorrelationAggregator
+from nlhs_tick_data_hungary.network.sparcc.edge_list_filter import EdgeListFilter
+from nlhs_tick_data_hungary.network.sparcc import DirichletResampler
+
+
+class CLRRunner:
+    """
+    Estimates the correlations of compositional data as the median of the CLR correlations of Dirichlet replicates.
+
+    It is a much cheaper alternative of SparCC (no basis variance estimation and no exclusion process) for quick
+    screens. The replicates are drawn and their CLR correlations are computed in batches with single vectorized calls,
+    then the median is computed by a `CorrelationAggregator`.
+    """
+
+    def __init__(self, df: pd.DataFrame, args: dict):
+        """
+        Initializes the CLRRunner with data and parameters.
+
+        :param pd.DataFrame df: Input dataframe containing compositional data (samples in the rows).
+        :param dict args: Dictionary of parameters: 'n_iter' (number of Dirichlet replicates), and optionally 'seed',
+        'clr_batch_size' (number of replicates processed at once, 100 by default), 'clr_pseudo_count' (added to the
+        replicates before the logarithm, 0 by default: the Dirichlet fractions are strictly positive), 'dtype',
+        'aggregation', 'aggregation_dir', 'aggregation_block_size', 'percentiles', 'edge_threshold' and 'top_k' (see
+        `SparCCRunner`).
+        """
+        self.df = df
+        self.args = args
+
+        # Attributes to store the median correlation matrix, the additional percentiles and the sparse edge list
+        self.result: (np.ndarray | None) = None
+        self.percentiles: dict = {}
+        self.edges: (dict | None) = None
+
+    def run(self):
+        """
+        Draws the Dirichlet replicates, computes their CLR correlations and the median correlation matrix.
+        """
+        num_of_iterations = self.args['n_iter']
+        num_of_components = self.df.shape[1]
+        # The runner has its own batch size key, the 'batch_size' of the shared SparCC args is meant for `SparCCRunner`
+        batch_size = max(1, self.args.get('clr_batch_size') or 100)
+
+        # Filter collecting the sparse edge list while the median is computed
+        edge_filter = None
+        if self.args.get('edge_threshold') is not None or self.args.get('top_k') is not None:
+            edge_filter = EdgeListFilter(num_of_components=num_of_components,
+                                         threshold=self.args.get('edge_threshold'),
+                                         top_k=self.args.get('top_k'))
+
+        aggregator = CorrelationAggregator(num_of_iterations=num_of_iterations,
+                                           num_of_components=num_of_components,
+                                           mode=self.args.get('aggregation', 'memory'),
+                                           percentiles=self.args.get('percentiles'),
+                                           directory=self.args.get('aggregation_dir'),
+                                           block_size=self.args.get('aggregation_block_size'),
+                                           edge_filter=edge_filter,
+                                           dtype=self.args.get('dtype', 'float64'))
+
+        resampler = DirichletResampler(data=self.df, rng=np.random.default_rng(self.args.get('seed')),
+                                       dtype=self.args.get('dtype', 'float64'))
+        # The stored replicates of the aggregator (and its temporary files) are released once the median is computed
+        try:
+            for start in range(0, num_of_iterations, batch_size):
+                # CLR correlations of a batch of replicates at once
+                resampled_data = resampler.resample(num_of_draws=min(batch_size, num_of_iterations - start))
+                correlations = CLRCalculator.run_clr_batch(data=resampled_data,
+                                                           pseudo_count=self.args.get('clr_pseudo_count', 0))
+                for offset, iteration_correlations in enumerate(correlations):
+                    aggregator.add(iteration=start + offset, correlations=iteration_correlations)
+
+            aggregator.run()
+            self.result = aggregator.result
+            self.percentiles = aggregator.percentile_results
+        finally:
+            aggregator.close()
+        if edge_filter is not None:
+            edge_filter.run()
+            self.edges = edge_filter.result
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class ConvergenceMonitor:
+    """
+    A class for deciding when the bootstrap iterations of SparCC can be stopped.
+
+    After every `window` iterations the running median correlation matrix is compared with the one of the previous
+    check. The iterations are considered converged when the maximal absolute change of the edge-wise estimates over
+    the window is not greater than the tolerance. An edge that became (or stopped being) NaN counts as an infinite
+    change, so the check cannot pass while the set of valid edges is still changing.
+    """
+
+    def __init__(self, tolerance: float, window: int = 10, min_iterations: int | None = None):
+        """
+        Initializes the monitor.
+
+        :param float tolerance: The allowed maximal absolute change of the running median over a window.
+        :param int window: The number of iterations between two checks.
+        :param int | None min_iterations: The number of iterations that are always run (two windows if not given).
+        """
+        self.tolerance = tolerance
+        self.window = max(1, window)
+        self.min_iterations = min_iterations if min_iterations is not None else 2 * self.window
+
+        # Running median of the previous check
+        self.previous_estimate: (np.ndarray | None) = None
+        # Maximal absolute change of every check: list of (number of iterations, change) tuples
+        self.history: list = []
+        self.converged: bool = False
+
+    def is_check_due(self, num_of_iterations: int) -> bool:
+        """
+        Decides whether the running median has to be checked after the given number of iterations.
+
+        :param int num_of_iterations: The number of completed iterations.
+        :return bool: True at the end of every window.
+        """
+        return num_of_iterations % self.window == 0
+
+    def update(self, num_of_iterations: int, running_estimate: np.ndarray) -> bool:
+        """
+        Compares the running median with the one of the previous check.
+
+        :param int num_of_iterations: The number of completed iterations.
+        :param np.ndarray running_estimate: The running median correlation matrix.
+        :return bool: True if the iterations converged and can be stopped.
+        """
+        if self.previous_estimate is not None:
+            with np.errstate(invalid='ignore'):
+                changes = np.abs(running_estimate - self.previous_estimate)
+            # A change of the valid edges is an infinite change, edges that are NaN in both estimates are skipped
+            changes[np.isnan(running_estimate) != np.isnan(self.previous_estimate)] = np.inf
+            max_change = np.nanmax(changes) if not np.all(np.isnan(changes)) else 0.0
+            self.history.append((num_of_iterations, float(max_change)))
+
+            self.converged = num_of_iterations >= self.min_iterations and max_change <= self.tolerance
+
+        self.previous_estimate = running_estimate
+        return self.converged
@@ -0,0 +1,235 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from nlhs_tick_data_hungary.network.sparcc.edge_list_filter import EdgeListFilter
+
+
+class CorrelationAggregator:
+    """
+    A class for aggregating the correlation matrices of the SparCC iterations into the median correlation matrix
+    (and optionally further percentiles).
+
+    Three modes are available:
+    - 'memory': The iterations are stored in a preallocated (n_iter x D x D) array in the memory.
+    - 'memmap': The iterations are written into a disk-backed `np.memmap` and the median is computed in row blocks,
+      so only one block of the iterations is loaded into the memory at a time. If no directory is given, the file is
+      created in a temporary directory, which is removed by `close`.
+    - 'online': Every edge gets a fixed-bin histogram over [-1, 1] and the quantiles are estimated from the
+      histograms, so the memory usage does not depend on the number of iterations. The iterations are not kept.
+      The histograms take num_of_bins counters per edge (uint16 for fewer than 65535 iterations), so they only need
+      less memory than the stored iterations if n_iter * itemsize > num_of_bins * counter itemsize (e.g. above 50
+      float64 iterations with the default 200 bins). Below this break-even point the 'memory' mode is used instead.
+
+    The requested percentiles are computed from the same loaded block (or histogram) as the median. If an
+    `EdgeListFilter` is given, the blocks of the median are passed to it as soon as they are computed.
+    """
+
+    def __init__(self, num_of_iterations: int, num_of_components: int, mode: str = 'memory',
+                 percentiles: list | None = None, directory: str | None = None, block_size: int | None = None,
+                 num_of_bins: int = 200, edge_filter: EdgeListFilter | None = None,
+                 dtype: np.dtype | str = np.float64):
+        """
+        Initializes the aggregator and allocates the storage of the selected mode.
+
+        :param int num_of_iterations: The (maximal) number of iterations to aggregate.
+        :param int num_of_components: The number of components (size of the correlation matrices).
+        :param str mode: The aggregation mode: 'memory', 'memmap' or 'online' (replaced by 'memory' below the
+        break-even point of the histograms).
+        :param list | None percentiles: Additional percentiles (between 0 and 100) to compute, e.g. [2.5, 97.5].
+        :param str | None directory: The directory of the `np.memmap` file (a temporary directory removed by `close` if
+        not given).
+        :param int | None block_size: The number of rows processed at once (estimated from the sizes if not given).
+        :param int num_of_bins: The number of histogram bins used by the 'online' mode.
+        :param EdgeListFilter | None edge_filter: A filter collecting the edges from the blocks of the median.
+        :param np.dtype | str dtype: The floating point type of the stored iterations and the results.
+        """
+        self.num_of_iterations = num_of_iterations
+        self.num_of_components = num_of_components
+        self.mode = mode
+        self.percentiles = list(percentiles) if percentiles is not None else []
+        self.num_of_bins = num_of_bins
+        self.edge_filter = edge_filter
+        self.dtype = np.dtype(dtype)
+
+        # The temporary directory of the 'memmap' mode created by the aggregator (removed by `close`)
+        self.temporary_directory: (str | None) = None
+
+        # Process roughly 64 MB of iterations at once if the block size is not given
+        self.block_size = block_size or max(1, 2 ** 23 // max(1, num_of_iterations * num_of_components))
+
+        # Number of added iterations
+        self.num_of_added: int = 0
+
+        # Smallest integer type that can count every iteration (of the histograms of the 'online' mode)
+        count_dtype = np.uint16 if num_of_iterations < np.iinfo(np.uint16).max else np.uint32
+        # The histograms would need more memory than storing the iterations
+        histogram_size = num_of_bins * np.dtype(count_dtype).itemsize
+        if self.mode == 'online' and num_of_iterations * self.dtype.itemsize <= histogram_size:
+            self.mode = 'memory'
+
+        shape = (num_of_iterations, num_of_components, num_of_components)
+        if self.mode == 'memory':
+            self.iterations = np.empty(shape, dtype=self.dtype)
+        elif self.mode == 'memmap':
+            if directory is None:
+                directory = self.temporary_directory = tempfile.mkdtemp(prefix='SparCC_aggregation_')
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, 'correlation_iterations.dat')
+            self.iterations = np.memmap(self.path, dtype=self.dtype, mode='w+', shape=shape)
+        elif self.mode == 'online':
+            self.histograms = np.zeros((num_of_components, num_of_components, num_of_bins), dtype=count_dtype)
+        else:
+            raise ValueError(f"Unknown aggregation mode: {self.mode}")
+
+        # Attributes to store the median correlation matrix and the additional percentiles
+        self.result: (np.ndarray | None) = None
+        self.percentile_results: dict = {}
+
+    def add(self, iteration: int, correlations: np.ndarray) -> np.ndarray | None:
+        """
+        Adds the correlation matrix of an iteration to the aggregation.
+
+        :param int iteration: The index of the iteration.
+        :param np.ndarray correlations: The correlation matrix of the iteration.
+        :return np.ndarray | None: The stored copy of the correlation matrix (a view of the in-memory or disk-backed
+        array), or None in 'online' mode, where the iterations are not kept, and in 'memmap' mode with a temporary
+        directory, where the iterations are removed by `close`.
+        """
+        self.num_of_added = max(self.num_of_added, iteration + 1)
+
+        if self.mode == 'online':
+            self.add_to_histograms(correlations=correlations)
+            return None
+
+        self.iterations[iteration] = correlations
+        if self.temporary_directory is not None:
+            return None
+        return self.iterations[iteration]
+
+    def add_to_histograms(self, correlations: np.ndarray):
+        """
+        Increments the histogram bin of every edge that contains the correlation of the edge.
+        Correlations outside [-1, 1] are counted in the first or last bin, NaN values are skipped.
+
+        :param np.ndarray correlations: The correlation matrix of an iteration.
+        """
+        flat_correlations = correlations.ravel()
+        valid = ~np.isnan(flat_correlations)
+
+        bins = np.floor((flat_correlations[valid] + 1) / 2 * self.num_of_bins).astype(np.int64)
+        np.clip(bins, 0, self.num_of_bins - 1, out=bins)
+
+        # Every edge is incremented at most once, so fancy indexing is enough (no need for `np.add.at`)
+        self.histograms.reshape(-1)[np.flatnonzero(valid) * self.num_of_bins + bins] += 1
+
+    def run(self):
+        """
+        Computes the median correlation matrix and the additional percentiles from the added iterations.
+        """
+        if self.mode == 'memory':
+            self.aggregate_block(rows=slice(None))
+            if self.edge_filter is not None:
+                self.edge_filter.add_block(start=0, block=self.result)
+            return
+
+        self.result = np.empty((self.num_of_components, self.num_of_components), dtype=self.dtype)
+        self.percentile_results = {
+            percentile: np.empty((self.num_of_components, self.num_of_components), dtype=self.dtype)
+            for percentile in self.percentiles
+        }
+        for start in range(0, self.num_of_components, self.block_size):
+            rows = slice(start, min(start + self.block_size, self.num_of_components))
+            if self.mode == 'memmap':
+                self.aggregate_block(rows=rows)
+            else:
+                self.estimate_block_from_histograms(rows=rows)
+
+            if self.edge_filter is not None:
+                self.edge_filter.add_block(start=start, block=self.result[rows])
+
+    def close(self):
+        """
+        Releases the stored iterations and removes the temporary directory of the 'memmap' mode (if the aggregator
+        created it). The results remain available.
+        """
+        if self.mode != 'online':
+            # Drop the reference to the stored iterations (the memory-mapped file is unmapped when it is released)
+            self.iterations = None
+        if self.temporary_directory is not None:
+            shutil.rmtree(self.temporary_directory, ignore_errors=True)
+            self.temporary_directory = None
+
+    def get_running_median(self) -> np.ndarray:
+        """
+        Computes the median correlation matrix of the iterations added so far, without finishing the aggregation.
+
+        :return np.ndarray: The running median correlation matrix.
+        """
+        running_median = np.empty((self.num_of_components, self.num_of_components), dtype=self.dtype)
+        for start in range(0, self.num_of_components, self.block_size):
+            rows = slice(start, min(start + self.block_size, self.num_of_components))
+            if self.mode == 'online':
+                running_median[rows] = self.estimate_quantile(rows=rows, quantile=0.5)
+            else:
+                running_median[rows] = np.nanmedian(np.asarray(self.iterations[:self.num_of_added, rows]), axis=0)
+
+        return running_median
+
+    def aggregate_block(self, rows: slice):
+        """
+        Computes the median and the percentiles of a block of rows from the stored iterations.
+
+        :param slice rows: The rows of the correlation matrices to aggregate.
+        """
+        # Load the block of every added iteration only once
+        block = np.asarray(self.iterations[:self.num_of_added, rows])
+
+        median = np.nanmedian(block, axis=0)
+        percentiles = np.nanpercentile(block, self.percentiles, axis=0) if self.percentiles else []
+
+        if self.mode == 'memory':
+            self.result = median
+            self.percentile_results = {percentile: values for percentile, values in zip(self.percentiles, percentiles)}
+        else:
+            self.result[rows] = median
+            for percentile, values in zip(self.percentiles, percentiles):
+                self.percentile_results[percentile][rows] = values
+
+    def estimate_block_from_histograms(self, rows: slice):
+        """
+        Estimates the median and the percentiles of a block of rows from the histograms by linear interpolation
+        within the bin containing the quantile.
+
+        :param slice rows: The rows of the correlation matrices to aggregate.
+        """
+        self.result[rows] = self.estimate_quantile(rows=rows, quantile=0.5)
+        for percentile in self.percentiles:
+            self.percentile_results[percentile][rows] = self.estimate_quantile(rows=rows, quantile=percentile / 100)
+
+    def estimate_quantile(self, rows: slice, quantile: float) -> np.ndarray:
+        """
+        Estimates a quantile of every edge in the block of rows from the histograms.
+
+        :param slice rows: The rows of the correlation matrices.
+        :param float quantile: The quantile to estimate (between 0 and 1).
+        :return np.ndarray: The estimated quantiles (NaN for edges without valid values).
+        """
+        cumulative_counts = np.cumsum(self.histograms[rows], axis=-1, dtype=np.int64)
+        num_of_values = cumulative_counts[..., -1]
+        target = quantile * num_of_values
+
+        # Index of the first bin where the cumulative count reaches the target
+        bins = np.minimum((cumulative_counts < target[..., np.newaxis]).sum(axis=-1), self.num_of_bins - 1)
+        counts_in_bin = np.take_along_axis(self.histograms[rows], bins[..., np.newaxis], axis=-1)[..., 0]
+        counts_until_bin = np.take_along_axis(cumulative_counts, bins[..., np.newaxis], axis=-1)[..., 0]
+        counts_before_bin = counts_until_bin - counts_in_bin
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.clip((target - counts_before_bin) / counts_in_bin, 0, 1)
+        estimate = -1 + (bins + np.nan_to_num(fraction)) * 2 / self.num_of_bins
+        estimate[num_of_values == 0] = np.nan
+
+        return estimate
@@ -35,9 +35,48 @@ class CorrelationCalculator:
         the log-ratio variances. The obtained values are then substituted into the appropriate formula
         to compute correlations.
         """
-        # Create a meshgrid for basis variances
-        omega_i, omega_j = np.meshgrid(self.basis_variances, self.basis_variances)
-        # Storing correlations
-        numerator = 0.5 * (omega_i + omega_j - self.log_ratio_variance)
-        # Compute and store the correlation matrix
-        self.result = numerator / np.sqrt(omega_i) / np.sqrt(omega_j)
+        self.result = CorrelationCalculator.substitute_into_formula_batch(log_ratio_variances=self.log_ratio_variance,
+                                                                          basis_variances=self.basis_variances)
+
+    @staticmethod
+    def substitute_into_formula_batch(log_ratio_variances: np.ndarray, basis_variances: np.ndarray,
+                                      out: np.ndarray | None = None, tile_size: int | None = None) -> np.ndarray:
+        """
+        Computes the correlation matrices of a stack of iterations with broadcasting instead of meshgrids.
+
+        The correlation between the ith and jth component is 0.5 * (omega_i + omega_j - t_ij) / sqrt(omega_i * omega_j),
+        it is computed in place in the output buffer, so no (D x D) temporaries are created.
+
+        :param np.ndarray log_ratio_variances: The log-ratio variances, with shape (D, D) or (iterations, D, D).
+        :param np.ndarray basis_variances: The basis variances, with shape (D,) or (iterations, D).
+        :param np.ndarray | None out: A preallocated buffer for the result, with the shape of the log-ratio variances.
+        :param int | None tile_size: If given, the rows are processed in tiles of this many rows (e.g. for memory-mapped
+        matrices), otherwise at once.
+        :return np.ndarray: The correlation matrix (or matrices).
+        """
+        if out is None:
+            out = np.empty(np.broadcast_shapes(log_ratio_variances.shape, basis_variances.shape[:-1] + (1, 1)),
+                           dtype=np.result_type(log_ratio_variances, basis_variances))
+
+        num_of_rows = log_ratio_variances.shape[-2]
+        tile_size = tile_size if tile_size is not None else num_of_rows
+        sqrt_variances = np.sqrt(basis_variances)
+
+        for start in range(0, num_of_rows, tile_size):
+            rows = slice(start, start + tile_size)
+            out_tile = out[..., rows, :]
+
+            # omega_i changes along the columns, omega_j along the rows
+            omega_i = basis_variances[..., np.newaxis, :]
+            omega_j = basis_variances[..., rows, np.newaxis]
+
+            # Numerator: 0.5 * (omega_i + omega_j - t_ij)
+            np.add(omega_i, omega_j, out=out_tile)
+            out_tile -= log_ratio_variances[..., rows, :]
+            out_tile *= 0.5
+
+            # Dividing by the square roots one after the other
+            out_tile /= sqrt_variances[..., np.newaxis, :]
+            out_tile /= sqrt_variances[..., rows, np.newaxis]
+
+        return out
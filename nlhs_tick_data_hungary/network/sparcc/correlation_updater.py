@@ -2,6 +2,8 @@ import numpy as np
 
 from nlhs_tick_data_hungary.network.sparcc import BasisVarianceCalculator
 from nlhs_tick_data_hungary.network.sparcc import CorrelationCalculator
+from nlhs_tick_data_hungary.network.sparcc import HelperMatrixSolver
+from nlhs_tick_data_hungary.network.sparcc.stage_profiler import StageProfiler
 
 
 class CorrelationUpdater:
@@ -13,7 +15,10 @@ class CorrelationUpdater:
 
     @staticmethod
     def calculate_correlation(newly_calculated_log_ratio_variances: np.ndarray, helper_matrix: np.ndarray,
-                              initial_log_ratio_variance: np.ndarray | None) -> np.ndarray:
+                              initial_log_ratio_variance: np.ndarray | None,
+                              helper_matrix_solver: HelperMatrixSolver | None = None,
+                              out: np.ndarray | None = None, tile_size: int | None = None,
+                              profiler: StageProfiler | None = None) -> np.ndarray:
         """
         Computes the updated correlation matrix using the provided log-ratio variances and helper matrix.
 
@@ -22,21 +27,61 @@ class CorrelationUpdater:
         :param np.ndarray helper_matrix: An array containing the helper matrix (also referenced as the $M$ matrix)
         :param np.ndarray initial_log_ratio_variance: An array containing the original (before the exclusion iteration)
          log-ratio variances
+        :param HelperMatrixSolver | None helper_matrix_solver: A solver tracking the modifications of the helper matrix
+        :param np.ndarray | None out: A preallocated (e.g. memory-mapped) buffer for the correlation matrix
+        :param int | None tile_size: If given, the matrices are processed in tiles of this many rows
+        :param StageProfiler | None profiler: The profiler recording the 'basis_variance' stage
         :return np.ndarray: The updated correlation matrix.
         """
+        profiler = profiler if profiler is not None else StageProfiler(enabled=False)
         variance_calculator = BasisVarianceCalculator(log_ratio_variance=newly_calculated_log_ratio_variances,
-                                                      helper_matrix=helper_matrix)
-        variance_calculator.run()
+                                                      helper_matrix=helper_matrix,
+                                                      helper_matrix_solver=helper_matrix_solver,
+                                                      tile_size=tile_size)
+        with profiler.stage('basis_variance'):
+            variance_calculator.run()
         basis_variances = variance_calculator.result
 
         # If we want to calculate the correlation before the exclusion process, then we only have one version of
-        # log-ratio variances
+        # log-ratio variances (it is only read by the correlation calculation, so no copy is needed)
         if initial_log_ratio_variance is None:
-            initial_log_ratio_variance = newly_calculated_log_ratio_variances.copy()
+            initial_log_ratio_variance = newly_calculated_log_ratio_variances
         # For the calculation of the correlation we need the "original", firstly calculated log-ratio variances
         # Because the flow chart in the original documentation says that after each iteration we only
         # recalculate the "component variations" (sum of the columns in the variation matrix)
+        if out is not None or tile_size is not None:
+            return CorrelationCalculator.substitute_into_formula_batch(log_ratio_variances=initial_log_ratio_variance,
+                                                                       basis_variances=basis_variances,
+                                                                       out=out, tile_size=tile_size)
+
         correlation_calculator = CorrelationCalculator(log_ratio_variance=initial_log_ratio_variance,
                                                        basis_variances=basis_variances)
         correlation_calculator.run()
         return correlation_calculator.result
+
+    @staticmethod
+    def calculate_correlations(log_ratio_variances: np.ndarray, helper_matrix: np.ndarray | None,
+                               helper_matrix_solver: HelperMatrixSolver | None = None,
+                               out: np.ndarray | None = None, profiler: StageProfiler | None = None) -> np.ndarray:
+        """
+        Computes the correlation matrices of several iterations at once (before the exclusion process, so every
+        iteration shares the same helper matrix).
+
+        :param np.ndarray log_ratio_variances: A stack of log-ratio variances with shape (iterations, D, D)
+        :param np.ndarray | None helper_matrix: An array containing the helper matrix (also referenced as the $M$
+        matrix), it can be None if a solver is given
+        :param HelperMatrixSolver | None helper_matrix_solver: A solver tracking the modifications of the helper matrix
+        :param np.ndarray | None out: A preallocated buffer for the correlation matrices
+        :param StageProfiler | None profiler: The profiler recording the 'basis_variance' stage
+        :return np.ndarray: The stack of correlation matrices with shape (iterations, D, D).
+        """
+        profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        variance_calculator = BasisVarianceCalculator(log_ratio_variance=log_ratio_variances,
+                                                      helper_matrix=helper_matrix,
+                                                      helper_matrix_solver=helper_matrix_solver)
+        with profiler.stage('basis_variance'):
+            variance_calculator.run()
+
+        return CorrelationCalculator.substitute_into_formula_batch(log_ratio_variances=log_ratio_variances,
+                                                                   basis_variances=variance_calculator.result,
+                                                                   out=out)
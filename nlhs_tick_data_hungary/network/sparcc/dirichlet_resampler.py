@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+
+class DirichletResampler:
+    """
+    A class for estimating the component fractions by resampling the data from Dirichlet distributions.
+
+    Every column of the data is treated as the parameter vector (counts + 1) of a Dirichlet distribution.
+    A Dirichlet sample is drawn by normalising independent Gamma(alpha_k, 1) draws, so the fractions of every column
+    (and optionally of several iterations) are generated with a single vectorized call of the random generator.
+    The draws can be generated directly in float32 (the generator produces a different stream for float32).
+    """
+
+    def __init__(self, data: pd.DataFrame | np.ndarray, rng: np.random.Generator,
+                 dtype: np.dtype | str = np.float64):
+        """
+        Initializes the resampler with the data and the random generator.
+
+        :param pd.DataFrame | np.ndarray data: The compositional (count) data to resample.
+        :param np.random.Generator rng: The random generator used for the draws.
+        :param np.dtype | str dtype: The floating point type of the draws (float64 or float32).
+        """
+        self.dtype = np.dtype(dtype)
+        # Parameters of the Dirichlet distributions (one distribution for each column)
+        self.alpha = np.asarray(data, dtype=self.dtype) + 1
+        self.rng = rng
+
+    def resample(self, num_of_draws: int | None = None) -> np.ndarray:
+        """
+        Draws resampled component fractions for every column of the data.
+
+        :param int | None num_of_draws: The number of resampled datasets to draw at once. If None, a single dataset
+        with the shape of the data is returned, otherwise an array of shape (num_of_draws, *data.shape).
+        :return np.ndarray: The resampled component fractions (every column sums up to 1).
+        """
+        fractions = self.draw_gamma(num_of_draws=num_of_draws)
+        # Normalising the Gamma draws column-wise results in Dirichlet distributed fractions
+        fractions /= fractions.sum(axis=-2, keepdims=True)
+
+        return fractions
+
+    def draw_gamma(self, num_of_draws: int | None = None) -> np.ndarray:
+        """
+        Draws the unnormalised Gamma(alpha, 1) variables of every element of the data. Normalising any subset of the
+        rows of a column gives a Dirichlet sample of that subset, so one draw can be shared by subsamples of the data.
+
+        :param int | None num_of_draws: The number of datasets to draw at once (a single dataset if None).
+        :return np.ndarray: The Gamma draws with the shape of the data (or (num_of_draws, *data.shape)).
+        """
+        size = self.alpha.shape if num_of_draws is None else (num_of_draws, *self.alpha.shape)
+
+        # Gamma draws for every element of every requested dataset in one call
+        return self.rng.standard_gamma(self.alpha, size=size, dtype=self.dtype)
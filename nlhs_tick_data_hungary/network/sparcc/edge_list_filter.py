@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class EdgeListFilter:
+    """
+    A class for collecting the edges of the SparCC network from the blocks of rows of the median correlation matrix.
+
+    An edge (i, j) is kept if its absolute correlation exceeds the threshold and it belongs to the top-k strongest
+    correlations of i or j (if both criteria are given, an edge has to satisfy both of them). NaN correlations and the
+    diagonal are never kept. The result is a COO-style edge list (every edge appears once with i < j), so the dense
+    correlation matrix never has to be turned into a complete graph.
+    """
+
+    def __init__(self, num_of_components: int, threshold: float | None = None, top_k: int | None = None):
+        """
+        Initializes the filter.
+
+        :param int num_of_components: The number of components (nodes).
+        :param float | None threshold: Edges with absolute correlation not greater than this value are dropped.
+        :param int | None top_k: If given, only the top-k strongest edges of every node are kept (and only those of
+        them that also exceed the threshold if the threshold is given). No edge is kept if it is 0.
+        """
+        self.num_of_components = num_of_components
+        self.threshold = threshold
+        self.top_k = top_k
+
+        # Edges collected from the blocks
+        self.rows: list = []
+        self.cols: list = []
+        self.weights: list = []
+
+        # Attribute to store the COO-style edge list
+        self.result: (dict | None) = None
+
+    def add_block(self, start: int, block: np.ndarray):
+        """
+        Collects the edges of a block of rows of the correlation matrix.
+
+        :param int start: The index of the first row of the block.
+        :param np.ndarray block: The rows of the correlation matrix with shape (rows, D).
+        """
+        row_indices = np.arange(start, start + block.shape[0])
+        abs_block = np.abs(block)
+
+        if self.top_k is None:
+            # Only the upper triangle is needed when every edge is checked
+            mask = (np.arange(self.num_of_components)[np.newaxis, :] > row_indices[:, np.newaxis]) & ~np.isnan(block)
+            if self.threshold is not None:
+                mask &= abs_block > self.threshold
+            block_rows, cols = np.nonzero(mask)
+            rows = row_indices[block_rows]
+        else:
+            # No edge is selected if k is 0 (or the network has a single node)
+            k = min(self.top_k, self.num_of_components - 1)
+            if k <= 0:
+                return
+
+            # The strongest k edges of every row (NaN values and the diagonal are never selected)
+            scores = np.where(np.isnan(abs_block), -np.inf, abs_block)
+            scores[np.arange(block.shape[0]), row_indices] = -np.inf
+            cols = np.argpartition(-scores, k - 1, axis=1)[:, :k].ravel()
+            block_rows = np.repeat(np.arange(block.shape[0]), k)
+            keep = np.isfinite(scores[block_rows, cols])
+            if self.threshold is not None:
+                keep &= scores[block_rows, cols] > self.threshold
+            block_rows, cols = block_rows[keep], cols[keep]
+            rows = row_indices[block_rows]
+
+        self.rows.append(rows)
+        self.cols.append(cols)
+        self.weights.append(block[block_rows, cols])
+
+    def run(self):
+        """
+        Creates the COO-style edge list from the collected edges: every edge is stored once (row < col), ordered by
+        (row, col).
+        """
+        rows = np.concatenate(self.rows) if self.rows else np.array([], dtype=np.int64)
+        cols = np.concatenate(self.cols) if self.cols else np.array([], dtype=np.int64)
+        weights = np.concatenate(self.weights) if self.weights else np.array([])
+
+        # Every edge once, with the smaller index first (an edge can be in the top-k of both of its nodes)
+        first, second = np.minimum(rows, cols), np.maximum(rows, cols)
+        _, unique_indices = np.unique(first * self.num_of_components + second, return_index=True)
+
+        self.result = {
+            "row": first[unique_indices],
+            "col": second[unique_indices],
+            "weight": weights[unique_indices],
+            "num_of_nodes": self.num_of_components
+        }
@@ -0,0 +1,153 @@
+import numpy as np
+
+
+class HelperMatrixSolver:
+    """
+    A class for solving the M x = b equation of the basis variance estimation without inverting the helper matrix.
+
+    The initial helper matrix (M) is (D - 2) * I + J, where J is the matrix of ones. Its inverse has the closed form
+    (I - J / (2D - 2)) / (D - 2). Every excluded pair (i, j) subtracts the rank-1 matrix u u^T (u = e_i + e_j) from M,
+    while an excluded component c reduces the system to the remaining components (the row and column of c are replaced
+    by the unit vector). The solver keeps track of these modifications and solves the equation with the
+    Sherman-Morrison-Woodbury formula in O(D * k + k^3) time, where k is the number of excluded pairs.
+    """
+
+    def __init__(self, num_of_components: int):
+        """
+        Initializes the solver with the structure of the initial helper matrix.
+
+        :param int num_of_components: The number of components (the size of the helper matrix).
+        """
+        self.num_of_components = num_of_components
+        # The diagonal of the initial helper matrix is `diagonal_offset + 1`, every other element is 1
+        self.diagonal_offset = num_of_components - 2
+
+        # Mask of the components that were not excluded
+        self.kept_components = np.ones(num_of_components, dtype=bool)
+        # List to store excluded pairs
+        self.excluded_pairs = []
+
+    def exclude_pair(self, i: int, j: int):
+        """
+        Registers the exclusion of the (i, j) pair (M[i, j], M[j, i], M[i, i] and M[j, j] are decreased by one).
+
+        :param int i: Index of the first component of the pair.
+        :param int j: Index of the second component of the pair.
+        """
+        self.excluded_pairs.append((i, j))
+
+    def exclude_component(self, component: int):
+        """
+        Registers the exclusion of a component (its row and column in M are replaced by the unit vector).
+
+        :param int component: Index of the excluded component.
+        """
+        self.kept_components[component] = False
+
+    def solve(self, b: np.ndarray) -> np.ndarray:
+        """
+        Solves the M x = b equation for the current state of the helper matrix.
+
+        Falls back to the least-squares (Moore-Penrose) solution of the structured system if the modified matrix is
+        (numerically) singular, see `solve_least_squares`.
+
+        :param np.ndarray b: The right-hand side of the equation (sum of the columns of the log-ratio variances),
+        or a matrix whose columns are right-hand sides (e.g. of several iterations).
+        :return np.ndarray: The solution of the equation (with the shape of b).
+        """
+        # The helper matrix of at most two components has no structure to exploit (it is at most 2 x 2)
+        if self.diagonal_offset <= 0:
+            return np.dot(np.linalg.pinv(self.get_helper_matrix()), b)
+
+        # Mask of the kept components, broadcastable to b
+        kept_components = self.kept_components.reshape((-1,) + (1,) * (b.ndim - 1))
+        kept = kept_components.astype(float)
+
+        # Rows of the excluded components contain only the diagonal element (1), so x_c = b_c
+        x = np.where(kept_components, 0.0, b)
+
+        # Solution of the unmodified (reduced) system
+        y = self.apply_initial_inverse(b * kept, kept)
+        if not self.excluded_pairs:
+            return x + y
+
+        # Columns of U are the (e_i + e_j) vectors of the excluded pairs restricted to the kept components
+        u = np.zeros((self.num_of_components, len(self.excluded_pairs)))
+        pair_indices = np.arange(len(self.excluded_pairs))
+        first, second = np.array(self.excluded_pairs).T
+        np.add.at(u, (first, pair_indices), 1)
+        np.add.at(u, (second, pair_indices), 1)
+        u *= self.kept_components[:, np.newaxis]
+
+        # Woodbury formula: (M0 - U U^T)^-1 = M0^-1 + M0^-1 U (I - U^T M0^-1 U)^-1 U^T M0^-1
+        z = self.apply_initial_inverse(u, self.kept_components[:, np.newaxis].astype(float))
+        capacitance = np.eye(len(self.excluded_pairs)) - np.dot(u.T, z)
+        if np.linalg.cond(capacitance) > 1e12:
+            return x + self.solve_least_squares(b=b * kept, u=u)
+
+        return x + y + np.dot(z, np.linalg.solve(capacitance, np.dot(u.T, y)))
+
+    def solve_least_squares(self, b: np.ndarray, u: np.ndarray) -> np.ndarray:
+        """
+        Computes the least-squares solution with minimal norm (the Moore-Penrose solution) of the reduced system,
+        without building the helper matrix.
+
+        On the kept components the helper matrix is d * I + W C W^T, where d is the diagonal offset, W = [1, U] holds
+        the vector of ones and the vectors of the excluded pairs, and C = diag(1, -1, ..., -1). With the orthonormal
+        basis Q of the columns of W (W = Q R), it is d * (I - Q Q^T) + Q S Q^T with the small matrix
+        S = d * I + R C R^T (at most (k + 1) x (k + 1)), so the singular part of the system is solved with
+        `np.linalg.lstsq` on S, and the rest is divided by d.
+
+        :param np.ndarray b: The right-hand side(s), zero at the excluded components.
+        :param np.ndarray u: The vectors of the excluded pairs restricted to the kept components (D x k).
+        :return np.ndarray: The solution (with the shape of b), zero at the excluded components.
+        """
+        kept = self.kept_components.astype(float)
+        basis, triangle = np.linalg.qr(np.column_stack([kept, u]))
+        signs = np.ones(triangle.shape[1])
+        signs[1:] = -1
+        small_system = self.diagonal_offset * np.eye(basis.shape[1]) + np.dot(triangle * signs, triangle.T)
+
+        # Singular values below the rounding error of the helper matrix (not of S) are treated as zero, like
+        # `np.linalg.pinv` of the helper matrix does
+        projected_b = np.dot(basis.T, b)
+        tolerance = np.finfo(float).eps * self.num_of_components * (self.diagonal_offset + self.kept_components.sum())
+        largest_singular_value = np.linalg.norm(small_system, ord=2)
+        if largest_singular_value <= tolerance:
+            solution = np.zeros(projected_b.shape)
+        else:
+            solution = np.linalg.lstsq(small_system, projected_b, rcond=tolerance / largest_singular_value)[0]
+
+        return (b - np.dot(basis, projected_b)) / self.diagonal_offset + np.dot(basis, solution)
+
+    def apply_initial_inverse(self, v: np.ndarray, kept: np.ndarray) -> np.ndarray:
+        """
+        Multiplies the vector(s) with the inverse of the initial helper matrix reduced to the kept components.
+
+        :param np.ndarray v: A vector or a matrix (columns are vectors), zero at the excluded components.
+        :param np.ndarray kept: The float mask of the kept components (broadcastable to v).
+        :return np.ndarray: The product, zero at the excluded components.
+        """
+        num_of_kept = self.kept_components.sum()
+        return (v - kept * v.sum(axis=0) / (self.diagonal_offset + num_of_kept)) / self.diagonal_offset
+
+    def get_helper_matrix(self) -> np.ndarray:
+        """
+        Builds the helper matrix explicitly from the registered modifications.
+
+        :return np.ndarray: The helper matrix (M).
+        """
+        helper_matrix = (np.ones((self.num_of_components, self.num_of_components)) +
+                         np.diag([self.diagonal_offset] * self.num_of_components))
+        for i, j in self.excluded_pairs:
+            helper_matrix[i, j] -= 1
+            helper_matrix[j, i] -= 1
+            helper_matrix[i, i] -= 1
+            helper_matrix[j, j] -= 1
+
+        for component in np.where(~self.kept_components)[0]:
+            helper_matrix[component, :] = 0
+            helper_matrix[:, component] = 0
+            helper_matrix[component, component] = 1
+
+        return helper_matrix
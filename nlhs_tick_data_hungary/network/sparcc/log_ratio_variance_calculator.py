@@ -13,13 +13,22 @@ class LogRatioVarianceCalculator:
     variables.
     """
 
-    def __init__(self, data: pd.DataFrame):
+    def __init__(self, data: pd.DataFrame, dtype: np.dtype | str | None = None, out: np.ndarray | None = None,
+                 tile_size: int | None = None):
         """
         Initialize the LogRatioVarianceCalculator with a given DataFrame.
 
         :param data: A pandas DataFrame where each row represents a sample and each column represents an OTU.
+        :param np.dtype | str | None dtype: The floating point type of the computation (float64 if not given).
+        :param np.ndarray | None out: A preallocated (e.g. memory-mapped) buffer for the variance matrix of a single
+        dataset, used together with `tile_size`.
+        :param int | None tile_size: If given, the variance matrix of a single dataset is computed in tiles of this
+        many rows, so only one tile of the OTUs x OTUs matrix is held in the memory at a time.
         """
         self.data = data
+        self.dtype = np.dtype(dtype) if dtype is not None else np.dtype(np.float64)
+        self.out = out
+        self.tile_size = tile_size
 
         self.result: pd.DataFrame | None = None
 
@@ -33,25 +42,84 @@ class LogRatioVarianceCalculator:
         """
         Calculate the log-ratio variance for each pair of OTUs across all samples.
 
-        This method computes the log of the ratio between every pair of variables (i, j) for each
-        sample, and then calculates the variance of these log-ratios across all samples.
+        Instead of building the (samples x OTUs x OTUs) tensor of every log-ratio, the method uses the identity
+        Var(log x_i - log x_j) = Var(log x_i) + Var(log x_j) - 2 * Cov(log x_i, log x_j), so only the centered
+        log-data and the OTUs x OTUs covariance matrix of the logarithms are stored (O(D^2) memory).
 
         The resulting variance matrix (T) represents the variability of the log-ratio between
-        each pair of variables.
+        each pair of variables. A stack of datasets with shape (datasets, samples, OTUs) gives a stack of variance
+        matrices with shape (datasets, OTUs, OTUs).
         """
-        # Convert the DataFrame to a numpy array (of floats)
-        variable_data = 1.0 * np.asarray(self.data)
+        # Convert the DataFrame to a numpy array (of floats), always as a copy since it is modified in place
+        variable_data = np.array(self.data, dtype=self.dtype)
 
-        num_samples, num_otus = variable_data.shape
+        num_samples = variable_data.shape[-2]
 
-        # Create a 3D array where each element contains a copy of the variable_data along the 3rd dimension
-        data_expanded = np.tile(variable_data.reshape((num_samples, num_otus, 1)), (1, 1, num_otus))
+        # Per-column log statistics: center the logarithms of every OTU by their mean across the samples
+        log_data = np.log(variable_data)
+        log_data -= log_data.mean(axis=-2, keepdims=True)
 
-        # Transpose the data along the last two axes
-        data_transposed = data_expanded.transpose(0, 2, 1)
+        if self.tile_size is not None:
+            self.result = self.calc_log_ratio_var_in_tiles(log_data=log_data)
+            return
 
-        # Calculate the log of the ratio between every pair of variables (i, j) for each sample
-        log_ratios = np.log(1.0 * data_expanded / data_transposed)
+        # Covariance matrix of the logarithms (the variances of the OTUs are on the diagonal)
+        covariance = np.matmul(np.swapaxes(log_data, -1, -2), log_data) / (num_samples - 1)
 
-        # Compute the variance of the log-ratios for each OTUs
-        self.result = log_ratios.var(axis=0, ddof=1)
+        self.result = LogRatioVarianceCalculator.convert_covariance_to_log_ratio_variance(covariance=covariance)
+
+    @staticmethod
+    def convert_covariance_to_log_ratio_variance(covariance: np.ndarray) -> np.ndarray:
+        """
+        Converts the covariance matrix (or a stack of covariance matrices) of the logarithms into the log-ratio
+        variance matrix in place.
+
+        :param np.ndarray covariance: The covariance matrix of the logarithms of the OTUs (overwritten).
+        :return np.ndarray: The log-ratio variance matrix (the same array as the covariance matrix).
+        """
+        log_variances = np.diagonal(covariance, axis1=-2, axis2=-1).copy()
+
+        # Var(log x_i - log x_j) = Var(log x_i) + Var(log x_j) - 2 * Cov(log x_i, log x_j)
+        covariance *= -2
+        covariance += log_variances[..., :, np.newaxis]
+        covariance += log_variances[..., np.newaxis, :]
+
+        # Remove negative values that can only be caused by rounding errors
+        np.maximum(covariance, 0, out=covariance)
+
+        # The log-ratio of an OTU with itself is constantly zero (or undefined if the OTU has zero abundances)
+        diagonal = np.einsum('...ii->...i', covariance)
+        diagonal[...] = np.where(np.isfinite(log_variances), 0.0, np.nan)
+
+        return covariance
+
+    def calc_log_ratio_var_in_tiles(self, log_data: np.ndarray) -> np.ndarray:
+        """
+        Calculates the log-ratio variance matrix of a single dataset row tile by row tile into the output buffer.
+
+        :param np.ndarray log_data: The centered logarithms of the data (samples x OTUs).
+        :return np.ndarray: The log-ratio variance matrix (the output buffer if given).
+        """
+        num_samples, num_otus = log_data.shape
+        log_ratio_variances = self.out if self.out is not None else np.empty((num_otus, num_otus), dtype=self.dtype)
+
+        # Variances of the logarithms of the OTUs (the diagonal of the covariance matrix)
+        log_variances = np.einsum('ij,ij->j', log_data, log_data) / (num_samples - 1)
+
+        for start in range(0, num_otus, self.tile_size):
+            rows = slice(start, min(start + self.tile_size, num_otus))
+
+            # Covariances of the OTUs of the tile with every OTU
+            tile = np.dot(log_data[:, rows].T, log_data) / (num_samples - 1)
+            tile *= -2
+            tile += log_variances[rows, np.newaxis]
+            tile += log_variances[np.newaxis, :]
+            np.maximum(tile, 0, out=tile)
+
+            # The log-ratio of an OTU with itself is constantly zero (or undefined if the OTU has zero abundances)
+            tile_indices = np.arange(tile.shape[0])
+            tile[tile_indices, start + tile_indices] = np.where(np.isfinite(log_variances[rows]), 0.0, np.nan)
+
+            log_ratio_variances[rows] = tile
+
+        return log_ratio_variances
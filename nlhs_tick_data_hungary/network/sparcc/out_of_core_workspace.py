@@ -0,0 +1,106 @@
+import os
+import tempfile
+
+import numpy as np
+
+
+class OutOfCoreWorkspace:
+    """
+    A class for allocating the large (D x D) matrices of a SparCC iteration in disk-backed `np.memmap` files and for
+    choosing the size of the row tiles they are processed in.
+
+    The tile size is chosen so that about four (tile x D) arrays fit into the memory budget (a tile of the input, a tile
+    of the output and the temporaries of the computation). The memmaps are backed by anonymous temporary files, which
+    are deleted automatically when the arrays are released. The results of the iterations are saved into named `.npy`
+    files instead (see `save`), so they can be passed between processes by their paths.
+    """
+
+    def __init__(self, memory_budget: int, num_of_components: int, dtype: np.dtype | str = np.float64,
+                 directory: str | None = None):
+        """
+        Initializes the workspace.
+
+        :param int memory_budget: The memory (in bytes) the tiles of the computation may use.
+        :param int num_of_components: The number of components (the size of the matrices).
+        :param np.dtype | str dtype: The floating point type of the matrices.
+        :param str | None directory: The directory of the memmap files (the default temporary directory if not given).
+        """
+        self.memory_budget = memory_budget
+        self.num_of_components = num_of_components
+        self.dtype = np.dtype(dtype)
+        self.directory = directory
+
+        # Number of rows processed at once
+        self.tile_size: int = max(1, int(memory_budget) // (4 * num_of_components * self.dtype.itemsize))
+
+    @classmethod
+    def from_args(cls, args: dict, num_of_components: int) -> 'OutOfCoreWorkspace | None':
+        """
+        Creates the workspace from the parameters of SparCC.
+
+        :param dict args: Parameters of SparCC ('memory_budget', and optionally 'tile_dir' and 'dtype').
+        :param int num_of_components: The number of components.
+        :return OutOfCoreWorkspace | None: The workspace, or None if no 'memory_budget' is given.
+        """
+        if args.get('memory_budget') is None:
+            return None
+
+        return cls(memory_budget=args['memory_budget'],
+                   num_of_components=num_of_components,
+                   dtype=args.get('dtype', 'float64'),
+                   directory=args.get('tile_dir'))
+
+    def empty(self, shape: tuple | None = None) -> np.ndarray:
+        """
+        Allocates an uninitialized disk-backed array.
+
+        :param tuple | None shape: The shape of the array (D x D if not given).
+        :return np.ndarray: The memory-mapped array.
+        """
+        shape = shape if shape is not None else (self.num_of_components, self.num_of_components)
+        return np.memmap(tempfile.TemporaryFile(dir=self.directory), dtype=self.dtype, mode='w+', shape=shape)
+
+    def copy(self, array: np.ndarray) -> np.ndarray:
+        """
+        Copies a matrix into a new disk-backed array tile by tile.
+
+        :param np.ndarray array: The matrix to copy.
+        :return np.ndarray: The memory-mapped copy.
+        """
+        copied_array = self.empty(shape=array.shape)
+        for start in range(0, array.shape[0], self.tile_size):
+            copied_array[start:start + self.tile_size] = array[start:start + self.tile_size]
+
+        return copied_array
+
+    def save(self, array: np.ndarray) -> str:
+        """
+        Copies a matrix tile by tile into a new `.npy` file in the directory of the workspace, so it can be passed to
+        another process by its path instead of being pickled.
+
+        :param np.ndarray array: The matrix to save.
+        :return str: The path of the `.npy` file.
+        """
+        file_descriptor, path = tempfile.mkstemp(suffix='.npy', dir=self.directory)
+        os.close(file_descriptor)
+
+        saved_array = np.lib.format.open_memmap(path, mode='w+', dtype=array.dtype, shape=array.shape)
+        for start in range(0, array.shape[0], self.tile_size):
+            saved_array[start:start + self.tile_size] = array[start:start + self.tile_size]
+        saved_array.flush()
+
+        return path
+
+    @staticmethod
+    def load(path: str) -> np.ndarray:
+        """
+        Opens a matrix saved by `save` as a read-only memory-mapped array and removes its file (the mapping keeps the
+        data until the array is released).
+
+        :param str path: The path of the `.npy` file.
+        :return np.ndarray: The memory-mapped matrix.
+        """
+        array = np.load(path, mmap_mode='r')
+        os.remove(path)
+
+        return array
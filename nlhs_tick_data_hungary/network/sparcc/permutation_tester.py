@@ -0,0 +1,219 @@
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+import functools
+import typing
+
+import numpy as np
+import pandas as pd
+
+from nlhs_tick_data_hungary.network.sparcc.batch_submitter import BatchSubmitter
+from nlhs_tick_data_hungary.network.sparcc.correlation_aggregator import CorrelationAggregator
+from nlhs_tick_data_hungary.network.sparcc.correlation_updater import CorrelationUpdater
+from nlhs_tick_data_hungary.network.sparcc import DirichletResampler
+from nlhs_tick_data_hungary.network.sparcc import HelperMatrixSolver
+from nlhs_tick_data_hungary.network.sparcc import LogRatioVarianceCalculator
+from nlhs_tick_data_hungary.network.sparcc import StronglyCorrelatedPairHandler
+
+
+class PermutationTester:
+    """
+    A class for estimating the (pseudo) p-values of the SparCC correlations with permutation tests.
+
+    In every permutation the values of every component are shuffled independently across the samples, which destroys
+    the associations between the components while keeping their distributions. SparCC is run on the shuffled data
+    (with 'permutation_n_iter' Dirichlet resamplings) and the p-value of an edge is (b + 1) / (n + 1), where b is the
+    number of the n permutations where the absolute median correlation is at least as large as the observed one
+    (two-sided test). The observed data counts as one of the permutations, so a p-value is never 0.
+
+    The permutations are processed in batches, which can be distributed over a process pool (at most
+    'max_pending_batches' batches are submitted at a time). The resampled datasets of a permutation are drawn in
+    stacks, so the log-ratio variances and the correlations before the exclusion process are computed with a few
+    vectorized calls; at most 'permutation_stack_size' datasets are stacked at once (estimated from 'memory_budget' if
+    given). The correlations of the stacks are collected by a `CorrelationAggregator`, which keeps them on the disk if
+    'memory_budget' is given. Every permutation has its own random stream, so the result does not depend on the batch
+    size, the stack size or the number of workers.
+    """
+
+    def __init__(self, df: pd.DataFrame, args: dict, observed_correlations: np.ndarray,
+                 seed_sequence: np.random.SeedSequence, executor: Executor | None = None):
+        """
+        Initializes the tester with the data, the parameters and the observed correlations.
+
+        :param pd.DataFrame df: Input dataframe containing compositional data (samples in the rows).
+        :param dict args: Parameters of SparCC ('threshold', 'x_iter', 'n_iter', and optionally 'n_permutations',
+        'permutation_n_iter', 'permutation_batch_size', 'permutation_stack_size', 'memory_budget', 'aggregation',
+        'aggregation_block_size', 'max_pending_batches', 'n_jobs' and 'dtype').
+        :param np.ndarray observed_correlations: The median correlation matrix of the original data.
+        :param np.random.SeedSequence seed_sequence: The root of the random streams of the permutations.
+        :param Executor | None executor: An executor to run the batches with. If given, 'n_jobs' is ignored.
+        """
+        self.df = df
+        self.args = args
+        self.observed_correlations = observed_correlations
+        self.seed_sequence = seed_sequence
+        self.executor = executor
+
+        self.num_of_permutations = self.args.get('n_permutations', 100)
+
+        # Attribute to store the p-values
+        self.result: (np.ndarray | None) = None
+
+    def run(self):
+        """
+        Runs the permutations and computes the p-values from the number of exceedances.
+        """
+        observed = np.abs(self.observed_correlations)
+        num_of_exceedances = np.zeros(observed.shape, dtype=np.int64)
+        for permuted_correlations in self.run_permutations():
+            num_of_exceedances += np.abs(permuted_correlations) >= observed
+
+        # The observed data is counted as one of the permutations
+        self.result = (num_of_exceedances + 1) / (self.num_of_permutations + 1)
+        # Edges without an observed correlation have no p-value
+        self.result[np.isnan(observed)] = np.nan
+
+    def run_permutations(self) -> typing.Iterator[np.ndarray]:
+        """
+        Runs the permutations in batches, either serially or on an executor (process pool).
+
+        :return Iterator: An iterator over the median correlation matrices of the permutations.
+        """
+        # Spawn from a fresh copy of the root, so repeated runs get the same streams
+        permutation_seeds = np.random.SeedSequence(entropy=self.seed_sequence.entropy,
+                                                   spawn_key=self.seed_sequence.spawn_key
+                                                   ).spawn(self.num_of_permutations)
+        batch_size = max(1, self.args.get('permutation_batch_size', 8))
+        batches = [permutation_seeds[start:start + batch_size]
+                   for start in range(0, len(permutation_seeds), batch_size)]
+        run_permutation_batch = functools.partial(PermutationTester.run_permutation_batch, self.df, self.args)
+
+        # The batches are submitted lazily, so only a few batches are pending on the executor at a time
+        if self.executor is not None:
+            max_pending_batches = self.args.get('max_pending_batches') or 2 * (os.cpu_count() or 1)
+            batch_results = BatchSubmitter.submit_batches(executor=self.executor, function=run_permutation_batch,
+                                                          batches=batches, max_pending_batches=max_pending_batches)
+        elif self.args.get('n_jobs', 1) is None or self.args.get('n_jobs', 1) <= 1:
+            batch_results = map(run_permutation_batch, batches)
+        else:
+            n_jobs = self.args['n_jobs']
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                for batch_result in BatchSubmitter.submit_batches(
+                        executor=executor, function=run_permutation_batch, batches=batches,
+                        max_pending_batches=self.args.get('max_pending_batches') or 2 * n_jobs):
+                    yield from batch_result
+            return
+
+        for batch_result in batch_results:
+            yield from batch_result
+
+    @staticmethod
+    def get_stack_size(args: dict, num_of_samples: int, num_of_components: int) -> int:
+        """
+        Returns the number of resampled datasets whose correlations are computed together: 'permutation_stack_size'
+        if given, otherwise as many as fit into 'memory_budget' (every stacked dataset needs its N x D resampled data
+        and about three D x D matrices: the log-ratio variances, the correlations and the temporary matrices of the
+        solve), or 16 datasets.
+
+        :param dict args: Parameters of SparCC.
+        :param int num_of_samples: The number of samples (N).
+        :param int num_of_components: The number of components (D).
+        :return int: The number of stacked datasets.
+        """
+        if args.get('permutation_stack_size') is not None:
+            return max(1, args['permutation_stack_size'])
+        if args.get('memory_budget') is not None:
+            itemsize = np.dtype(args.get('dtype', 'float64')).itemsize
+            dataset_size = (num_of_samples + 3 * num_of_components) * num_of_components * itemsize
+            return max(1, args['memory_budget'] // dataset_size)
+        return 16
+
+    @staticmethod
+    def create_aggregator(args: dict, num_of_draws: int, num_of_components: int) -> CorrelationAggregator:
+        """
+        Creates the aggregator of the correlations of the resampled datasets of a permutation, with the same mode
+        selection as the `SparCCRunner`: with a 'memory_budget' the correlations are kept on the disk ('memmap' mode)
+        and the median is computed in row blocks fitting the budget.
+
+        :param dict args: Parameters of SparCC.
+        :param int num_of_draws: The number of resampled datasets of a permutation.
+        :param int num_of_components: The number of components (D).
+        :return CorrelationAggregator: The aggregator of the permutation.
+        """
+        dtype = np.dtype(args.get('dtype', 'float64'))
+        aggregation_mode = args.get('aggregation', 'memory')
+        aggregation_block_size = args.get('aggregation_block_size')
+        if args.get('memory_budget') is not None:
+            aggregation_mode = args.get('aggregation', 'memmap')
+            aggregation_block_size = aggregation_block_size or max(
+                1, args['memory_budget'] // (2 * num_of_draws * num_of_components * dtype.itemsize))
+
+        return CorrelationAggregator(num_of_iterations=num_of_draws,
+                                     num_of_components=num_of_components,
+                                     mode=aggregation_mode,
+                                     block_size=aggregation_block_size,
+                                     dtype=dtype)
+
+    @staticmethod
+    def run_permutation_batch(df: pd.DataFrame, args: dict, permutation_seeds: list) -> np.ndarray:
+        """
+        Runs SparCC on a batch of permuted datasets. The resampled datasets of a permutation are drawn and processed
+        one stack at a time, and the correlations of every stack are passed to the aggregator of the permutation, so
+        only one stack is kept in the memory.
+
+        :param pd.DataFrame df: Input dataframe containing compositional data.
+        :param dict args: Parameters of SparCC.
+        :param list permutation_seeds: The seed sequence of every permutation of the batch.
+        :return np.ndarray: The median correlation matrices of the permutations with shape (permutations, D, D).
+        """
+        dtype = np.dtype(args.get('dtype', 'float64'))
+        num_of_draws = args.get('permutation_n_iter', args['n_iter'])
+        data = np.asarray(df, dtype=dtype)
+        num_of_samples, num_of_components = data.shape
+        stack_size = PermutationTester.get_stack_size(args=args, num_of_samples=num_of_samples,
+                                                      num_of_components=num_of_components)
+
+        median_correlations = np.empty((len(permutation_seeds), num_of_components, num_of_components), dtype=dtype)
+        for permutation, permutation_seed in enumerate(permutation_seeds):
+            # Shuffle every component independently (the resampler draws the stacks from the same stream, so the
+            # draws do not depend on the stack size)
+            rng = np.random.default_rng(permutation_seed)
+            resampler = DirichletResampler(data=rng.permuted(data, axis=0), rng=rng, dtype=dtype)
+
+            aggregator = PermutationTester.create_aggregator(args=args, num_of_draws=num_of_draws,
+                                                             num_of_components=num_of_components)
+            try:
+                for start in range(0, num_of_draws, stack_size):
+                    resampled_data = resampler.resample(num_of_draws=min(stack_size, num_of_draws - start))
+
+                    # Log-ratio variances and correlations of the stacked resampled datasets at once
+                    log_ratio_variance_calculator = LogRatioVarianceCalculator(data=resampled_data, dtype=dtype)
+                    log_ratio_variance_calculator.run()
+                    log_ratio_variances = log_ratio_variance_calculator.result
+                    correlations = CorrelationUpdater.calculate_correlations(
+                        log_ratio_variances=log_ratio_variances,
+                        helper_matrix=None,
+                        helper_matrix_solver=HelperMatrixSolver(num_of_components=num_of_components)
+                    )
+
+                    # The exclusion process runs separately for every resampled dataset (the solver tracks the
+                    # exclusions, no dense helper matrix is built)
+                    for offset in range(len(resampled_data)):
+                        iterative_process = StronglyCorrelatedPairHandler(
+                            log_ratio_variances=log_ratio_variances[offset],
+                            correlations=correlations[offset],
+                            helper_matrix=None,
+                            exclusion_threshold=args['threshold'],
+                            exclusion_iterations=args['x_iter'],
+                            resampled_data=resampled_data[offset],
+                            helper_matrix_solver=HelperMatrixSolver(num_of_components=num_of_components)
+                        )
+                        iterative_process.run()
+                        aggregator.add(iteration=start + offset, correlations=iterative_process.correlations)
+
+                # Median of the resampled datasets of the permutation
+                aggregator.run()
+                median_correlations[permutation] = aggregator.result
+            finally:
+                aggregator.close()
+
+        return median_correlations
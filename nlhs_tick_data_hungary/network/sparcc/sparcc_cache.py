@@ -0,0 +1,183 @@
+import copy
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from nlhs_tick_data_hungary.network.sparcc.sparcc_result import SparCCResult
+
+
+class SparCCCache:
+    """
+    A persistent, content-addressed cache for the results of SparCC runs.
+
+    The key of a run is the hash of the input matrix, its column order, the SparCC arguments that affect the result,
+    the version of the cache format and the hash of the sources of the sparcc package (so a change of the algorithm
+    invalidates the entries). Every entry is a directory in the binary output format of `SparCCResult` (`.npy` files
+    and a JSON manifest) containing the final median (with the percentiles, the edge list and the p-values) and the
+    per-iteration clr flags; the per-iteration correlation matrices are not cached. When the size of the cache
+    directory exceeds the limit, the least recently used entries are removed.
+
+    Only seeded runs should be cached, an unseeded run is expected to give a different result every time.
+    """
+
+    # Version of the layout of the entries, increased when the stored files change
+    CACHE_FORMAT_VERSION = 2
+
+    # Arguments that do not change the result of the run, so they are not part of the key
+    IGNORED_ARGS = ['n_jobs', 'do_download_data', 'output_dir', 'output_format', 'writer_queue_size',
+                    'aggregation_dir', 'aggregation_block_size', 'use_cache', 'cache_dir', 'cache_max_bytes']
+
+    # Hash of the sources of the sparcc package (computed once per process)
+    source_hash: (str | None) = None
+
+    def __init__(self, cache_dir: str | None = None, max_size_bytes: int = 2 ** 30):
+        """
+        Initializes the cache and creates its directory.
+
+        :param str | None cache_dir: The directory of the cached results (the user cache directory if not given, see
+        `get_default_cache_dir`).
+        :param int max_size_bytes: The maximal total size of the cached results in bytes.
+        """
+        self.cache_dir = cache_dir or self.get_default_cache_dir()
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def get_default_cache_dir() -> str:
+        """
+        Returns the default directory of the cache in the cache directory of the user ('$XDG_CACHE_HOME' or
+        '~/.cache'), so the cache does not depend on the working directory.
+
+        :return str: The default cache directory.
+        """
+        user_cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(user_cache_dir, 'nlhs_tick_data_hungary', 'sparcc')
+
+    @classmethod
+    def get_source_hash(cls) -> str:
+        """
+        Computes the hash of the sources of the sparcc package.
+
+        :return str: The hexadecimal SHA-256 hash of the names and the contents of the Python files of the package.
+        """
+        if cls.source_hash is None:
+            source_hash = hashlib.sha256()
+            package_dir = os.path.dirname(os.path.abspath(__file__))
+            for name in sorted(os.listdir(package_dir)):
+                if name.endswith('.py'):
+                    source_hash.update(name.encode())
+                    with open(os.path.join(package_dir, name), 'rb') as file:
+                        source_hash.update(file.read())
+            cls.source_hash = source_hash.hexdigest()
+
+        return cls.source_hash
+
+    def get_key(self, df: pd.DataFrame, args: dict) -> str:
+        """
+        Computes the key of a SparCC run.
+
+        :param pd.DataFrame df: Input dataframe of the run.
+        :param dict args: The arguments of the run.
+        :return str: The hexadecimal SHA-256 hash identifying the run.
+        """
+        values = np.ascontiguousarray(np.asarray(df, dtype=float))
+        # The arguments in the form they have in the manifest (e.g. a NumPy integer seed as a Python integer)
+        relevant_args = SparCCResult.to_json_value(
+            {key: value for key, value in args.items() if key not in self.IGNORED_ARGS}
+        )
+
+        key = hashlib.sha256()
+        key.update(str(values.shape).encode())
+        key.update(values.tobytes())
+        key.update(repr(list(df.columns)).encode())
+        key.update(json.dumps(relevant_args, sort_keys=True).encode())
+        key.update(str(self.CACHE_FORMAT_VERSION).encode())
+        key.update(self.get_source_hash().encode())
+
+        return key.hexdigest()
+
+    def get_path(self, key: str) -> str:
+        """
+        Returns the path of the directory of a cache entry.
+
+        :param str key: The key of the entry.
+        :return str: The path of the directory of the entry.
+        """
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key: str) -> SparCCResult | None:
+        """
+        Loads a cached result and marks it as recently used.
+
+        :param str key: The key of the run.
+        :return SparCCResult | None: The cached result, or None if the run is not cached.
+        """
+        path = self.get_path(key)
+        manifest_path = os.path.join(path, SparCCResult.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+
+        result = SparCCResult.load(output_dir=path)
+        # Read the memory-mapped arrays into the memory, so the entry can be evicted while the result is used
+        if result.final_result is not None:
+            result.final_result = np.array(result.final_result)
+        if result.p_values is not None:
+            result.p_values = np.array(result.p_values)
+        # The modification time of the manifest is used as the time of the last access for the LRU eviction
+        os.utime(manifest_path)
+
+        return result
+
+    def save(self, key: str, result: SparCCResult, columns: list):
+        """
+        Saves a result into the cache, then evicts the least recently used entries if the cache is too large.
+
+        :param str key: The key of the run.
+        :param SparCCResult result: The result of the run.
+        :param list columns: The column names of the data of the run.
+        """
+        path = self.get_path(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        os.makedirs(temporary_path)
+
+        # Keep only the aggregated results and the metadata of the iterations (every remaining iteration was run)
+        cached_result = copy.copy(result)
+        cached_result.correlation_stack = None
+        cached_result.resampled_stack = None
+        cached_result.set_output(output_dir=temporary_path, columns=columns, seed_entropy=result.seed_entropy)
+        cached_result.num_of_completed_iterations = len(result.results)
+        cached_result.save_final_results()
+        cached_result.write_manifest()
+
+        # Write into a temporary directory first, so a concurrent reader cannot see a partially written entry
+        try:
+            os.replace(temporary_path, path)
+        except OSError:
+            # The same entry was saved by a concurrent run
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the total size of the cache is within the limit.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            manifest_path = os.path.join(path, SparCCResult.MANIFEST_FILE)
+            if name.endswith('.tmp') or not os.path.exists(manifest_path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            entries.append((os.stat(manifest_path).st_mtime, size, path))
+
+        total_size = 0
+        for _, size, path in sorted(entries, reverse=True):
+            total_size += size
+            if total_size > self.max_size_bytes:
+                shutil.rmtree(path, ignore_errors=True)
@@ -1,3 +1,4 @@
+import json
 import os
 
 import numpy as np
@@ -11,7 +12,23 @@ class SparCCResult:
     This class holds the per-iteration results (correlation matrix and a bool value to indicate if the result is from
     the calculation of clr) in a dictionary, as well as the final median correlation matrix computed over
     all iterations. It also provides methods for saving both the resampled data and the per-iteration results in files.
+
+    Two output formats are supported: the binary format writes one `.npy` stack of every iteration's correlation
+    matrices and resampled data per run with a small JSON manifest (args, column names and clr flags), which can be
+    loaded lazily with `SparCCResult.load`. The CSV format writes separate files into a folder for every iteration.
+    In both formats the manifest also works as a checkpoint (number of completed iterations and the entropy of the
+    random streams), so an interrupted run can be resumed.
     """
+
+    # Names of the output files
+    MANIFEST_FILE = 'manifest.json'
+    CORRELATION_MATRICES_FILE = 'correlation_matrices.npy'
+    RESAMPLED_DATA_FILE = 'resampled_data.npy'
+    FINAL_RESULT_FILE = 'final_result.npy'
+    PERCENTILES_FILE = 'percentiles.npz'
+    EDGES_FILE = 'edges.npz'
+    P_VALUES_FILE = 'p_values.npy'
+
     def __init__(self, args: dict):
         """
         Initializes the SparCCResult instance.
@@ -26,8 +43,39 @@ class SparCCResult:
             for iteration in range(self.args['n_iter'])
         }
         self.final_result = None  # The final median correlation matrix.
+        self.percentiles = {}  # Additional percentiles of the iterations (percentile -> correlation matrix).
+        # Sparse (COO-style) edge list of the final result: {"row", "col", "weight", "num_of_nodes"}
+        self.edges: (dict | None) = None
+        # Permutation p-values of the edges of the final result (if 'n_permutations' is in the args)
+        self.p_values: (np.ndarray | None) = None
+        # Stage profile of the run (if 'profile' is True in the args): the summary of every stage, and the records of
+        # the stages per iteration, see `StageProfiler`
+        self.profile: (dict | None) = None
+        self.profile_records: (pd.DataFrame | None) = None
+
+        # Attributes of the binary output format
+        self.output_dir: (str | None) = None
+        self.columns: (list | None) = None
+        self.correlation_stack: (np.ndarray | None) = None  # Stack of the correlation matrices (n_iter x D x D)
+        self.resampled_stack: (np.ndarray | None) = None  # Stack of the resampled data (n_iter x N x D)
+
+        # Checkpoint information: entropy of the random streams and the number of saved iterations
+        self.seed_entropy: (int | None) = None
+        self.num_of_completed_iterations: int = 0
+        # Number of iterations actually run (less than n_iter if the adaptive stopping ended the run early)
+        self.num_of_used_iterations: (int | None) = None
+
+    def trim_results(self, num_of_used_iterations: int):
+        """
+        Records the number of iterations actually run and removes the entries of the iterations that were not run.
+
+        :param int num_of_used_iterations: The number of iterations actually run.
+        """
+        self.num_of_used_iterations = num_of_used_iterations
+        for iteration in range(num_of_used_iterations, self.args['n_iter']):
+            self.results.pop(f"iteration_{iteration}", None)
 
-    def save_iteration_data(self, iteration_dir: str, iteration: int):
+    def save_iteration_data(self, iteration_dir: str, iteration: int, correlation_matrix: np.ndarray | None = None):
         """
         Saves the iteration results to the filesystem.
 
@@ -35,12 +83,15 @@ class SparCCResult:
 
         :param str iteration_dir: The directory where the files will be saved.
         :param int iteration: The current iteration number.
+        :param np.ndarray | None correlation_matrix: The correlation matrix to save, if not given, it is taken from
+        the stored iteration results.
         """
-        iteration_key = f"iteration_{iteration}"
-        iter_result = self.results.get(iteration_key, {})
+        if correlation_matrix is None:
+            iteration_key = f"iteration_{iteration}"
+            iter_result = self.results.get(iteration_key, {})
+            correlation_matrix = iter_result.get("correlation_matrix")
 
         # Save the correlation matrix as CSV if available.
-        correlation_matrix = iter_result.get("correlation_matrix")
         if correlation_matrix is not None:
             df_correlation = pd.DataFrame(correlation_matrix)
             df_correlation.to_csv(os.path.join(iteration_dir, "correlation_matrix.csv"), index=False)
@@ -58,3 +109,216 @@ class SparCCResult:
         """
         df_resampled = pd.DataFrame(resampled_data, columns=columns)
         df_resampled.to_csv(os.path.join(iteration_dir, "resampled_data.csv"), index=False)
+
+    def set_output(self, output_dir: str, columns: list, seed_entropy: int | None = None):
+        """
+        Sets the output directory and the metadata written into the manifest.
+
+        :param str output_dir: The directory of the output files.
+        :param list columns: List of the column names of the data.
+        :param int | None seed_entropy: The entropy of the root `SeedSequence` of the run (needed for resuming).
+        """
+        self.output_dir = output_dir
+        self.columns = list(columns)
+        self.seed_entropy = seed_entropy
+
+    def open_binary_output(self, resampled_shape: tuple, resume: bool = False, dtype: np.dtype | str = np.float64):
+        """
+        Creates (or reopens when resuming a run) the `.npy` stacks of the binary output format as memory-mapped files,
+        so the iterations can be written into them one by one.
+
+        :param tuple resampled_shape: The shape of the resampled data of an iteration.
+        :param bool resume: Whether to open the existing stacks of an interrupted run.
+        :param np.dtype | str dtype: The floating point type of the new stacks.
+        """
+        # Python integers (a NumPy integer would be written into the header of the `.npy` files as a call)
+        num_of_iterations = int(self.args['n_iter'])
+        num_of_components = len(self.columns)
+        shapes = {
+            self.CORRELATION_MATRICES_FILE: (num_of_iterations, num_of_components, num_of_components),
+            self.RESAMPLED_DATA_FILE: (num_of_iterations, *map(int, resampled_shape))
+        }
+        if resume:
+            stacks = {name: np.lib.format.open_memmap(os.path.join(self.output_dir, name), mode='r+')
+                      for name in shapes}
+        else:
+            stacks = {name: np.lib.format.open_memmap(os.path.join(self.output_dir, name), mode='w+',
+                                                      dtype=dtype, shape=shape)
+                      for name, shape in shapes.items()}
+
+        self.correlation_stack = stacks[self.CORRELATION_MATRICES_FILE]
+        self.resampled_stack = stacks[self.RESAMPLED_DATA_FILE]
+
+    def save_binary_iteration(self, iteration: int, resampled_data: np.ndarray,
+                              correlation_matrix: np.ndarray | None = None):
+        """
+        Writes the resampled data and the correlation matrix of an iteration into the `.npy` stacks.
+
+        :param int iteration: The current iteration number.
+        :param np.ndarray resampled_data: The numpy array containing the resampled data.
+        :param np.ndarray | None correlation_matrix: The correlation matrix to save, if not given, it is taken from
+        the stored iteration results.
+        """
+        self.resampled_stack[iteration] = resampled_data
+
+        if correlation_matrix is None:
+            correlation_matrix = self.results[f"iteration_{iteration}"].get("correlation_matrix")
+        if correlation_matrix is not None:
+            self.correlation_stack[iteration] = correlation_matrix
+
+    def save_checkpoint(self, num_of_completed_iterations: int):
+        """
+        Records that the first `num_of_completed_iterations` iterations are saved, so an interrupted run can be
+        resumed from the next iteration. The stacks are flushed before the manifest is (atomically) replaced.
+
+        :param int num_of_completed_iterations: The number of completed (and saved) iterations.
+        """
+        if self.correlation_stack is not None:
+            self.correlation_stack.flush()
+            self.resampled_stack.flush()
+
+        self.num_of_completed_iterations = num_of_completed_iterations
+        self.write_manifest()
+
+    def close_binary_output(self):
+        """
+        Flushes the `.npy` stacks, saves the final result (and the percentiles) and writes the manifest.
+        """
+        self.correlation_stack.flush()
+        self.resampled_stack.flush()
+
+        self.save_final_results()
+        self.write_manifest()
+
+    def save_final_results(self):
+        """
+        Saves the final result, the percentiles, the edge list and the p-values (the ones that were computed) into
+        the output directory.
+        """
+        if self.final_result is not None:
+            np.save(os.path.join(self.output_dir, self.FINAL_RESULT_FILE), self.final_result)
+        if self.percentiles:
+            np.savez(os.path.join(self.output_dir, self.PERCENTILES_FILE),
+                     **{str(percentile): values for percentile, values in self.percentiles.items()})
+        if self.edges is not None:
+            np.savez(os.path.join(self.output_dir, self.EDGES_FILE), **self.edges)
+        if self.p_values is not None:
+            np.save(os.path.join(self.output_dir, self.P_VALUES_FILE), self.p_values)
+
+    def write_manifest(self):
+        """
+        Writes the JSON manifest of the output (args, column names, clr flags and the checkpoint information).
+        """
+        manifest = {
+            "args": self.args,
+            "columns": self.columns,
+            "clr_run": [iteration_result["clr_run"] for iteration_result in self.results.values()],
+            "completed_iterations": self.num_of_completed_iterations,
+            "used_iterations": self.num_of_used_iterations,
+            "seed_entropy": self.seed_entropy
+        }
+        # Write into a temporary file first, so an interruption cannot leave a corrupted manifest behind
+        manifest_path = os.path.join(self.output_dir, self.MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w') as file:
+            json.dump(self.to_json_value(manifest), file, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    @classmethod
+    def to_json_value(cls, value):
+        """
+        Converts a value into the form it has in the manifest, so the values read back from the manifest can be
+        compared with the current ones: NumPy scalars and arrays are converted into Python numbers and lists, tuples
+        into lists, and other values that are not JSON serializable (e.g. the tuple column names of a MultiIndex)
+        into strings.
+
+        :param value: The value to convert.
+        :return: The JSON serializable value.
+        """
+        if isinstance(value, dict):
+            return {key if isinstance(key, str) else str(cls.to_json_value(key)): cls.to_json_value(item)
+                    for key, item in value.items()}
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return [cls.to_json_value(item) for item in value]
+        if isinstance(value, np.generic):
+            return value.item()
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        return str(value)
+
+    @classmethod
+    def read_manifest(cls, output_dir: str) -> dict | None:
+        """
+        Reads the manifest of an output directory.
+
+        :param str output_dir: The directory of the output files.
+        :return dict | None: The manifest, or None if the directory does not contain one.
+        """
+        manifest_path = os.path.join(output_dir, cls.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+
+        with open(manifest_path, 'r') as file:
+            return json.load(file)
+
+    def load_iteration_correlations(self, iteration: int) -> np.ndarray:
+        """
+        Loads the saved correlation matrix of an iteration (from the `.npy` stack or from the CSV file).
+
+        :param int iteration: The iteration number.
+        :return np.ndarray: The correlation matrix of the iteration.
+        """
+        if self.correlation_stack is not None:
+            return np.asarray(self.correlation_stack[iteration])
+
+        # `round_trip` parsing gives back exactly the saved floats
+        return pd.read_csv(os.path.join(self.output_dir, f"Iteration_{iteration}", "correlation_matrix.csv"),
+                           float_precision='round_trip').to_numpy()
+
+    @classmethod
+    def load(cls, output_dir: str) -> 'SparCCResult':
+        """
+        Loads a result saved in the binary output format. The stacks are memory-mapped (`np.load(mmap_mode='r')`),
+        so the iterations are only read from the disk when they are accessed. If the directory has no stacks (e.g. an
+        entry of the `SparCCCache`), only the final results and the clr flags of the iterations are loaded.
+
+        :param str output_dir: The directory of the output files.
+        :return SparCCResult: The loaded result object.
+        """
+        manifest = cls.read_manifest(output_dir=output_dir)
+
+        result = cls(args=manifest["args"])
+        result.set_output(output_dir=output_dir, columns=manifest["columns"], seed_entropy=manifest["seed_entropy"])
+        result.num_of_completed_iterations = manifest["completed_iterations"]
+        if os.path.exists(os.path.join(output_dir, cls.CORRELATION_MATRICES_FILE)):
+            result.correlation_stack = np.load(os.path.join(output_dir, cls.CORRELATION_MATRICES_FILE), mmap_mode='r')
+            result.resampled_stack = np.load(os.path.join(output_dir, cls.RESAMPLED_DATA_FILE), mmap_mode='r')
+
+        for iteration, clr_run in enumerate(manifest["clr_run"][:result.num_of_completed_iterations]):
+            result.results[f"iteration_{iteration}"] = {
+                "correlation_matrix": (result.correlation_stack[iteration]
+                                       if result.correlation_stack is not None else None),
+                "clr_run": clr_run
+            }
+        if manifest.get("used_iterations") is not None:
+            result.trim_results(num_of_used_iterations=manifest["used_iterations"])
+
+        final_result_path = os.path.join(output_dir, cls.FINAL_RESULT_FILE)
+        if os.path.exists(final_result_path):
+            result.final_result = np.load(final_result_path, mmap_mode='r')
+
+        percentiles_path = os.path.join(output_dir, cls.PERCENTILES_FILE)
+        if os.path.exists(percentiles_path):
+            with np.load(percentiles_path) as percentiles:
+                result.percentiles = {float(percentile): percentiles[percentile] for percentile in percentiles.files}
+
+        edges_path = os.path.join(output_dir, cls.EDGES_FILE)
+        if os.path.exists(edges_path):
+            with np.load(edges_path) as edges:
+                result.edges = {key: edges[key] for key in edges.files}
+                result.edges["num_of_nodes"] = int(result.edges["num_of_nodes"])
+
+        p_values_path = os.path.join(output_dir, cls.P_VALUES_FILE)
+        if os.path.exists(p_values_path):
+            result.p_values = np.load(p_values_path, mmap_mode='r')
+
+        return result
@@ -1,12 +1,26 @@
 import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+import functools
+import typing
 
 import datetime
 import numpy as np
 import pandas as pd
 
+from nlhs_tick_data_hungary.network.sparcc.async_iteration_writer import AsyncIterationWriter
+from nlhs_tick_data_hungary.network.sparcc.batch_submitter import BatchSubmitter
+from nlhs_tick_data_hungary.network.sparcc.convergence_monitor import ConvergenceMonitor
+from nlhs_tick_data_hungary.network.sparcc.correlation_aggregator import CorrelationAggregator
 from nlhs_tick_data_hungary.network.sparcc.correlation_updater import CorrelationUpdater
+from nlhs_tick_data_hungary.network.sparcc.edge_list_filter import EdgeListFilter
+from nlhs_tick_data_hungary.network.sparcc.out_of_core_workspace import OutOfCoreWorkspace
+from nlhs_tick_data_hungary.network.sparcc.permutation_tester import PermutationTester
+from nlhs_tick_data_hungary.network.sparcc import DirichletResampler
+from nlhs_tick_data_hungary.network.sparcc import HelperMatrixSolver
 from nlhs_tick_data_hungary.network.sparcc import LogRatioVarianceCalculator
 from nlhs_tick_data_hungary.network.sparcc import SparCCResult
+from nlhs_tick_data_hungary.network.sparcc.sparcc_cache import SparCCCache
+from nlhs_tick_data_hungary.network.sparcc.stage_profiler import StageProfiler
 from nlhs_tick_data_hungary.network.sparcc import StronglyCorrelatedPairHandler
 
 
@@ -14,26 +28,114 @@ class SparCCRunner:
     """
     Executes the SparCC algorithm on input data, iteratively estimating correlation matrices.
     Handles resampling, variance computation, and iterative correlation exclusion.
+
+    Every iteration gets its own random stream spawned from a `np.random.SeedSequence`, so the iterations are
+    independent of each other and can be distributed over a process pool without changing the result.
+
+    dtype: With 'dtype' 'float32' the resampling, the log-ratio variances and the correlations are computed in
+    float32, the basis variances are always solved in float64. Measured on the same resampled data of 50 iterations
+    (maximal / median absolute error against float64):
+    - 60 samples x 40 components: log-ratio variances 1.2e-6 / 1.2e-7, correlations 2.6e-7 / 3.9e-8, correlations
+      after the exclusions 2.7e-7 / 3.9e-8, median correlations 1.4e-7 / 2.7e-8.
+    - 200 samples x 150 components: log-ratio variances 1.7e-6 / 2.1e-7, correlations 3.0e-7 / 3.7e-8, correlations
+      after the exclusions 3.3e-7 / 3.7e-8, median correlations 1.6e-7 / 2.6e-8.
+    The float32 draws come from a different random stream, so the final median of a float32 run differs from the
+    float64 run only as much as it does when the seed is changed.
     """
 
-    def __init__(self, df: pd.DataFrame, args: dict):
+    def __init__(self, df: pd.DataFrame, args: dict, executor: Executor | None = None):
         """
         Initializes the SparCCRunner with data and algorithm parameters.
 
         :param pd.DataFrame df: Input dataframe containing compositional data.
         :param dict args: Dictionary of parameters controlling the number of iterations, threshold, and exclusions.
+        Optional keys:
+        - 'seed': Seed of the random generator used for the resampling.
+        - 'batch_resampling': Whether to draw the resampled data of every iteration in one vectorized call.
+        - 'n_jobs': Number of worker processes used for running the iterations.
+        - 'batch_size': Number of iterations whose correlations are computed together.
+        - 'max_pending_batches': Number of batches submitted to the external executor before their results are
+          consumed (twice the number of CPUs by default).
+        - 'aggregation': 'memory', 'memmap' or 'online', see `CorrelationAggregator`.
+        - 'aggregation_dir', 'aggregation_block_size': The directory and the block size of the aggregation.
+        - 'percentiles': Additional percentiles of the iterations, e.g. [2.5, 97.5].
+        - 'output_format': 'npy' for the binary output format, or 'csv' (used if 'do_download_data' is True).
+        - 'output_dir': Output directory. If it contains the checkpoint of an interrupted run, the run is resumed from
+          the first missing iteration.
+        - 'writer_queue_size': Number of iterations waiting for the background writer before the computation blocks.
+        - 'edge_threshold', 'top_k': If any of them is given, a sparse edge list filtered by the absolute correlation
+          and the top-k strongest edges of every node is also returned, see `EdgeListFilter`.
+        - 'use_cache': Whether to look up / store the result of a seeded run in the persistent `SparCCCache`
+          (unseeded runs are never cached). On a cache hit only the final results and the manifest are written into
+          the output directory, the per-iteration artifacts are not cached.
+        - 'cache_dir', 'cache_max_bytes': The directory (the user cache directory by default) and the size limit of
+          the cache.
+        - 'tolerance': If given, the iterations stop as soon as the running median changes less than the tolerance
+          over a window ('n_iter' is the maximal number of iterations), see `ConvergenceMonitor`.
+        - 'convergence_window', 'min_iter': The window and the minimal number of iterations of the stopping rule.
+        - 'dtype': 'float64' or 'float32', the floating point type of the resampling, the variances and the
+          correlations, see the dtype section of the class.
+        - 'n_permutations': If given, the permutation p-values of the edges are also computed, see
+          `PermutationTester`.
+        - 'permutation_n_iter', 'permutation_batch_size': The number of iterations of every permutation and the
+          number of permutations sent to a worker together.
+        - 'permutation_stack_size': The number of resampled datasets of a permutation whose correlations are computed
+          together (estimated from 'memory_budget' if not given).
+        - 'memory_budget': If given in bytes, the D x D matrices of the iterations are kept in memory-mapped files and
+          processed in row tiles that fit into the budget, and the iterations are aggregated in 'memmap' mode by
+          default, see `OutOfCoreWorkspace`.
+        - 'tile_dir': The directory of the memory-mapped files of the out-of-core mode.
+        - 'profile': Whether to record the wall time, the peak allocated memory and the number of exclusion steps of
+          the stages of every iteration, see `StageProfiler`.
+        :param Executor | None executor: An executor to run the iterations with. If given, 'n_jobs' is ignored.
         """
         # Original data
         self.df = df
         self.args = args
+        self.executor = executor
 
         # Attribute to store resampled data
         self.data = None
 
+        # Profiler of the stages of the run (disabled unless 'profile' is True)
+        self.profiler = StageProfiler(enabled=False)
+
         # Create output directory if saving is enabled
+        self.checkpoint: (dict | None) = None
         if self.args["do_download_data"]:
-            self.output_dir = f"SparCC_output_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            self.output_dir = (self.args.get('output_dir') or
+                               f"SparCC_output_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
             os.makedirs(self.output_dir, exist_ok=True)
+            # Checkpoint of an interrupted run in the output directory
+            self.checkpoint = self.load_checkpoint()
+
+        # Root of the random streams: the iterations use the spawned child streams, while the batched resampling
+        # draws every iteration from the root stream. A resumed run continues with the streams of the checkpoint.
+        self.seed_sequence = np.random.SeedSequence(
+            self.checkpoint["seed_entropy"] if self.checkpoint is not None else self.args.get('seed')
+        )
+
+    def load_checkpoint(self) -> dict | None:
+        """
+        Loads the checkpoint (manifest) of an interrupted run from the output directory.
+
+        :return dict | None: The manifest of the interrupted run, or None if there is nothing to resume.
+        """
+        manifest = SparCCResult.read_manifest(output_dir=self.output_dir)
+        # Without a completed iteration (e.g. the output written on a cache hit) the run starts from the first iteration
+        if manifest is None or manifest["completed_iterations"] == 0:
+            return None
+
+        # The resumed run has to continue the same computation (keys with their default values, compared in the form
+        # they are written into the manifest, e.g. a NumPy integer seed as a Python integer)
+        defaults = {'n_iter': None, 'threshold': None, 'x_iter': None, 'seed': None, 'batch_resampling': False,
+                    'output_format': 'npy', 'dtype': 'float64'}
+        for key, default in defaults.items():
+            if (SparCCResult.to_json_value(manifest["args"].get(key, default))
+                    != SparCCResult.to_json_value(self.args.get(key, default))):
+                raise ValueError(f"The '{key}' argument differs from the one of the run in '{self.output_dir}'.")
+
+        return manifest
 
     def run(self) -> SparCCResult:
         """
@@ -45,77 +147,529 @@ class SparCCRunner:
         :return object SparCCResult: Object containing the final result, and correlation matrices from every iteration
         and clr_run flags.
         """
+        # Return the cached result of the same run if available (an unseeded run is not reproducible, so it is not
+        # cached)
+        cache = None
+        if self.args.get('use_cache', False) and self.args.get('seed') is not None:
+            cache = SparCCCache(cache_dir=self.args.get('cache_dir'),
+                                max_size_bytes=self.args.get('cache_max_bytes', 2 ** 30))
+            cache_key = cache.get_key(df=self.df, args=self.args)
+            cached_result = cache.load(key=cache_key)
+            if cached_result is not None:
+                if self.args["do_download_data"]:
+                    self.write_cached_result(cached_result=cached_result)
+                return cached_result
+
         # Instantiate the result object
         result_obj = SparCCResult(args=self.args)
+        self.profiler = StageProfiler(enabled=self.args.get('profile', False))
+
+        # Filter collecting the sparse edge list while the median is computed
+        edge_filter = None
+        if self.args.get('edge_threshold') is not None or self.args.get('top_k') is not None:
+            edge_filter = EdgeListFilter(num_of_components=self.df.shape[1],
+                                         threshold=self.args.get('edge_threshold'),
+                                         top_k=self.args.get('top_k'))
+
+        # The out-of-core mode keeps the iterations on the disk and aggregates them in blocks fitting the budget (a
+        # loaded block and the temporary copy `np.nanmedian` makes of it)
+        aggregation_mode = self.args.get('aggregation', 'memory')
+        aggregation_block_size = self.args.get('aggregation_block_size')
+        if self.args.get('memory_budget') is not None:
+            aggregation_mode = self.args.get('aggregation', 'memmap')
+            aggregation_block_size = aggregation_block_size or max(
+                1, self.args['memory_budget'] // (2 * self.args['n_iter'] * self.df.shape[1] *
+                                                  np.dtype(self.args.get('dtype', 'float64')).itemsize))
 
         # To collect correlation matrices from each iteration for computing the median later.
-        correlation_results = []
-
-        for iteration in range(self.args['n_iter']):
-            self.estimate_component_fractions()
-
-            iteration_dir = None
-            if self.args["do_download_data"]:
-                # Create iteration folder
-                iteration_dir = os.path.join(self.output_dir, f"Iteration_{iteration}")
-                os.makedirs(iteration_dir, exist_ok=True)
-                # Saving resampled data in `SparCCResult`
-                result_obj.save_resampled_data(iteration_dir=iteration_dir,
-                                               resampled_data=self.data,
-                                               columns=list(self.df.columns))
-
-            # Compute log-ratio variances
-            log_ratio_variances = LogRatioVarianceCalculator(data=self.data)
-            log_ratio_variances.run()
-            log_ratio_variances = log_ratio_variances.result.copy()
-            num_of_components = log_ratio_variances.shape[1]
-
-            # Initialize helper matrix for variance calculations
+        aggregator = CorrelationAggregator(num_of_iterations=self.args['n_iter'],
+                                           num_of_components=self.df.shape[1],
+                                           mode=aggregation_mode,
+                                           percentiles=self.args.get('percentiles'),
+                                           directory=self.args.get('aggregation_dir'),
+                                           block_size=aggregation_block_size,
+                                           edge_filter=edge_filter,
+                                           dtype=self.args.get('dtype', 'float64'))
+
+        # The stored iterations of the aggregator (and its temporary files) are released once the median is computed
+        try:
+            num_of_used_iterations = self.run_and_aggregate_iterations(result_obj=result_obj, aggregator=aggregator)
+
+            # Compute the median correlation matrix (and the percentiles) across iterations and store it in result_obj
+            with self.profiler.stage('median'):
+                aggregator.run()
+                result_obj.final_result = aggregator.result
+                result_obj.percentiles = aggregator.percentile_results
+                if edge_filter is not None:
+                    edge_filter.run()
+                    result_obj.edges = edge_filter.result
+        finally:
+            aggregator.close()
+
+        if self.args.get('n_permutations'):
+            with self.profiler.stage('p_values'):
+                result_obj.p_values = self.calculate_p_values(observed_correlations=result_obj.final_result)
+        # Drop the entries of the iterations that were not run
+        result_obj.trim_results(num_of_used_iterations=num_of_used_iterations)
+        if self.args["do_download_data"] and self.args.get('output_format', 'npy') == 'csv':
+            result_obj.write_manifest()
+
+        if self.args["do_download_data"] and self.args.get('output_format', 'npy') == 'npy':
+            with self.profiler.stage('writing'):
+                result_obj.close_binary_output()
+
+        if self.profiler.enabled:
+            result_obj.profile = self.profiler.summarize()
+            result_obj.profile_records = self.profiler.to_dataframe()
+            self.profiler.close()
+
+        if cache is not None:
+            cache.save(key=cache_key, result=result_obj, columns=list(self.df.columns))
+
+        # Return the result object containing final and per-iteration information
+        return result_obj
+
+    def write_cached_result(self, cached_result: SparCCResult):
+        """
+        Writes the final results (with the percentiles, the edge list and the p-values) and the manifest of a cached
+        result into the output directory. The cache has no per-iteration artifacts, so the manifest records no
+        completed iteration and a later run in the same output directory starts from the first iteration.
+
+        :param SparCCResult cached_result: The result loaded from the cache.
+        """
+        cached_result.set_output(output_dir=self.output_dir, columns=list(self.df.columns),
+                                 seed_entropy=cached_result.seed_entropy)
+        cached_result.save_final_results()
+        # The returned result keeps the number of its iterations
+        num_of_completed_iterations = cached_result.num_of_completed_iterations
+        cached_result.num_of_completed_iterations = 0
+        cached_result.write_manifest()
+        cached_result.num_of_completed_iterations = num_of_completed_iterations
+
+    def run_and_aggregate_iterations(self, result_obj: SparCCResult, aggregator: CorrelationAggregator) -> int:
+        """
+        Runs the iterations (after the ones restored from a checkpoint), adds their correlations to the aggregator and
+        writes their artifacts, until every iteration is run or the running median converges.
+
+        :param SparCCResult result_obj: The result object of the run.
+        :param CorrelationAggregator aggregator: The aggregator of the correlations of the iterations.
+        :return int: The number of used iterations (including the restored ones).
+        """
+        # Monitor of the running median if the iterations can stop early
+        monitor = None
+        if self.args.get('tolerance') is not None:
+            monitor = ConvergenceMonitor(tolerance=self.args['tolerance'],
+                                         window=self.args.get('convergence_window', 10),
+                                         min_iterations=self.args.get('min_iter'))
+
+        num_of_completed_iterations = 0
+        if self.args["do_download_data"]:
+            result_obj.set_output(output_dir=self.output_dir,
+                                  columns=list(self.df.columns),
+                                  seed_entropy=self.seed_sequence.entropy)
+            if self.args.get('output_format', 'npy') == 'npy':
+                result_obj.open_binary_output(resampled_shape=self.df.shape, resume=self.checkpoint is not None,
+                                              dtype=self.args.get('dtype', 'float64'))
+            if self.checkpoint is not None:
+                num_of_completed_iterations = self.restore_checkpoint(result_obj=result_obj, aggregator=aggregator,
+                                                                      monitor=monitor)
+
+        # The artifacts of the iterations are written in a background thread while the next iteration is computed
+        writer = None
+        if self.args["do_download_data"]:
+            writer = AsyncIterationWriter(max_queue_size=self.args.get('writer_queue_size', 4))
+
+        num_of_used_iterations = num_of_completed_iterations
+        # No further iteration is run if the restored iterations already converged
+        iteration_results = self.run_iterations(
+            start=self.args['n_iter'] if monitor is not None and monitor.converged else num_of_completed_iterations
+        )
+        # Whether the loop finished without an exception
+        is_completed = False
+        try:
+            # The results arrive in the order of the iterations, regardless of the number of workers
+            for iteration, (resampled_data, correlations, did_clr_run, profile_records) in enumerate(
+                    iteration_results, start=num_of_completed_iterations):
+                self.data = resampled_data
+                self.profiler.add_records(records=profile_records, iteration=iteration)
+                # The correlations of the out-of-core mode arrive as the paths of their memory-mapped files
+                if self.args.get('memory_budget') is not None:
+                    correlations = OutOfCoreWorkspace.load(path=correlations)
+
+                # Save iteration results (correlation matrix and clr flag) into result_obj, the correlation matrix is
+                # the copy held by the aggregator (None if the aggregator does not keep the iterations)
+                with self.profiler.stage('aggregation', iteration=iteration):
+                    result_obj.results[f"iteration_{iteration}"] = {
+                        "correlation_matrix": aggregator.add(iteration=iteration, correlations=correlations),
+                        "clr_run": did_clr_run
+                    }
+
+                if writer is not None:
+                    writer.submit(self.save_iteration, result_obj=result_obj, iteration=iteration,
+                                  resampled_data=resampled_data, correlations=correlations)
+                    writer.submit(result_obj.save_checkpoint, num_of_completed_iterations=iteration + 1)
+
+                num_of_used_iterations = iteration + 1
+                if monitor is not None and monitor.is_check_due(num_of_iterations=num_of_used_iterations):
+                    with self.profiler.stage('convergence_check', iteration=iteration):
+                        converged = monitor.update(num_of_iterations=num_of_used_iterations,
+                                                   running_estimate=aggregator.get_running_median())
+                    if converged:
+                        break
+            is_completed = True
+        finally:
+            # Stop the remaining iterations (the pending work of the process pool is cancelled)
+            iteration_results.close()
+            # Wait until every iteration is written (also when the run is interrupted, so the checkpoint is complete).
+            # An error of the writer is only raised if no other exception is in flight, so it cannot replace it.
+            if writer is not None:
+                writer.close(raise_error=is_completed)
+
+        return num_of_used_iterations
+
+    def calculate_p_values(self, observed_correlations: np.ndarray) -> np.ndarray:
+        """
+        Computes the permutation p-values of the median correlations with the `PermutationTester`.
+
+        The permutations use the random streams spawned from the 'n_iter'th child of the root seed sequence, which is
+        not used by any iteration.
+
+        :param np.ndarray observed_correlations: The median correlation matrix of the original data.
+        :return np.ndarray: The p-values of the edges.
+        """
+        permutation_tester = PermutationTester(df=self.df,
+                                               args=self.args,
+                                               observed_correlations=observed_correlations,
+                                               seed_sequence=np.random.SeedSequence(
+                                                   entropy=self.seed_sequence.entropy,
+                                                   spawn_key=(self.args['n_iter'],)),
+                                               executor=self.executor)
+        permutation_tester.run()
+
+        return permutation_tester.result
+
+    def restore_checkpoint(self, result_obj: SparCCResult, aggregator: CorrelationAggregator,
+                           monitor: ConvergenceMonitor | None = None) -> int:
+        """
+        Restores the completed iterations of an interrupted run into the result object and the aggregator. The checks
+        of the convergence monitor are replayed on the restored iterations, so the resumed run stops at the same
+        iteration as an uninterrupted run.
+
+        :param SparCCResult result_obj: The result object of the resumed run.
+        :param CorrelationAggregator aggregator: The aggregator of the resumed run.
+        :param ConvergenceMonitor | None monitor: The convergence monitor of the resumed run.
+        :return int: The number of restored iterations.
+        """
+        num_of_completed_iterations = self.checkpoint["completed_iterations"]
+        for iteration in range(num_of_completed_iterations):
+            correlations = result_obj.load_iteration_correlations(iteration=iteration)
+            result_obj.results[f"iteration_{iteration}"] = {
+                "correlation_matrix": aggregator.add(iteration=iteration, correlations=correlations),
+                "clr_run": self.checkpoint["clr_run"][iteration]
+            }
+            if monitor is not None and monitor.is_check_due(num_of_iterations=iteration + 1):
+                monitor.update(num_of_iterations=iteration + 1, running_estimate=aggregator.get_running_median())
+        result_obj.num_of_completed_iterations = num_of_completed_iterations
+
+        return num_of_completed_iterations
+
+    def save_iteration(self, result_obj: SparCCResult, iteration: int, resampled_data: np.ndarray,
+                       correlations: np.ndarray):
+        """
+        Delegates the saving of the resampled data and the results of an iteration to `SparCCResult` in the
+        selected output format.
+
+        :param SparCCResult result_obj: The result object containing the results of the iteration.
+        :param int iteration: The current iteration number.
+        :param np.ndarray resampled_data: The resampled data of the iteration.
+        :param np.ndarray correlations: The correlation matrix of the iteration.
+        """
+        with self.profiler.stage('writing', iteration=iteration):
+            self.write_iteration(result_obj=result_obj, iteration=iteration, resampled_data=resampled_data,
+                                 correlations=correlations)
+
+    def write_iteration(self, result_obj: SparCCResult, iteration: int, resampled_data: np.ndarray,
+                        correlations: np.ndarray):
+        """
+        Writes the resampled data and the results of an iteration in the selected output format.
+
+        :param SparCCResult result_obj: The result object containing the results of the iteration.
+        :param int iteration: The current iteration number.
+        :param np.ndarray resampled_data: The resampled data of the iteration.
+        :param np.ndarray correlations: The correlation matrix of the iteration.
+        """
+        if self.args.get('output_format', 'npy') == 'npy':
+            result_obj.save_binary_iteration(iteration=iteration, resampled_data=resampled_data,
+                                             correlation_matrix=correlations)
+            return
+
+        # Create iteration folder
+        iteration_dir = os.path.join(self.output_dir, f"Iteration_{iteration}")
+        os.makedirs(iteration_dir, exist_ok=True)
+        # Saving resampled data in `SparCCResult`
+        result_obj.save_resampled_data(iteration_dir=iteration_dir,
+                                       resampled_data=resampled_data,
+                                       columns=list(self.df.columns))
+        # Delegate saving of correlation matrix and clr_run flag to SparCCResult
+        result_obj.save_iteration_data(iteration_dir=iteration_dir, iteration=iteration,
+                                       correlation_matrix=correlations)
+
+    def run_iterations(self, start: int = 0) -> typing.Iterator[typing.Tuple[np.ndarray, np.ndarray, bool, list]]:
+        """
+        Runs the iterations of the algorithm either serially or on an executor (process pool).
+
+        The iterations are processed in batches of 'batch_size' iterations (1 by default), the batches are the units
+        of work sent to the workers.
+
+        :param int start: The first iteration to run (the previous ones are restored from a checkpoint).
+        :return Iterator: An iterator over the (resampled data, correlation matrix, clr_run flag, profile records)
+        results of the iterations, in the order of the iterations.
+        """
+        iteration_inputs = self.get_iteration_inputs()[start:]
+        batch_size = max(1, self.args.get('batch_size', 1))
+        batches = [iteration_inputs[batch_start:batch_start + batch_size]
+                   for batch_start in range(0, len(iteration_inputs), batch_size)]
+        run_iteration_batch = functools.partial(SparCCRunner.run_iteration_batch, self.df, self.args)
+
+        if self.executor is not None:
+            max_pending_batches = self.args.get('max_pending_batches') or 2 * (os.cpu_count() or 1)
+            batch_results = BatchSubmitter.submit_batches(executor=self.executor, function=run_iteration_batch,
+                                                          batches=batches, max_pending_batches=max_pending_batches)
+        elif self.args.get('n_jobs', 1) is None or self.args.get('n_jobs', 1) <= 1:
+            batch_results = map(run_iteration_batch, batches)
+        else:
+            n_jobs = self.args['n_jobs']
+            # Send the batches to the workers in chunks to reduce the overhead of pickling the data
+            chunksize = max(1, len(batches) // (4 * n_jobs))
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                try:
+                    for batch_result in executor.map(run_iteration_batch, batches, chunksize=chunksize):
+                        yield from batch_result
+                except GeneratorExit:
+                    # The iterations were stopped early, the batches that are not started yet are not needed
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+            return
+
+        for batch_result in batch_results:
+            yield from batch_result
+
+    def get_iteration_inputs(self) -> list:
+        """
+        Creates the inputs of the resampling step of every iteration.
+
+        If batched resampling is requested, the resampled data of every iteration is drawn here in one vectorized
+        call, otherwise every iteration gets its own `SeedSequence` child and draws its data in the worker.
+
+        :return list: A list containing the resampled data or the seed sequence of every iteration.
+        """
+        if self.args.get('batch_resampling', False):
+            resampler = DirichletResampler(data=self.df, rng=np.random.default_rng(self.seed_sequence),
+                                           dtype=self.args.get('dtype', 'float64'))
+            return list(resampler.resample(num_of_draws=self.args['n_iter']))
+
+        # Spawn from a fresh copy of the root, so repeated runs get the same streams
+        return np.random.SeedSequence(self.seed_sequence.entropy).spawn(self.args['n_iter'])
+
+    @staticmethod
+    def run_iteration_batch(df: pd.DataFrame, args: dict, resampling_inputs: list
+                            ) -> typing.List[typing.Tuple[np.ndarray, np.ndarray | str, bool, list]]:
+        """
+        Runs a batch of iterations. The correlation matrices before the exclusion process are computed for the whole
+        batch at once with `CorrelationUpdater.calculate_correlations`, then the exclusion process runs separately
+        for every iteration.
+
+        If 'profile' is True in the args, the stages are recorded by a `StageProfiler` for every iteration (the
+        stacked stages of the batch are assigned to its first iteration).
+
+        :param pd.DataFrame df: Input dataframe containing compositional data.
+        :param dict args: Dictionary of parameters controlling the threshold and exclusions.
+        :param list resampling_inputs: The resampled data or the seed sequence of every iteration of the batch.
+        :return List[Tuple[np.ndarray, np.ndarray | str, bool, list]]: The resampled data, the correlation matrix (the
+        path of its `.npy` file in the out-of-core mode, see `OutOfCoreWorkspace.save`), the clr_run flag and the
+        profile records of every iteration of the batch.
+        """
+        profilers = [StageProfiler(enabled=args.get('profile', False)) for _ in resampling_inputs]
+
+        # The out-of-core mode processes the iterations one by one instead of stacking them
+        if len(resampling_inputs) == 1 or args.get('memory_budget') is not None:
+            iteration_results = [SparCCRunner.run_iteration(df=df, args=args, resampling_input=resampling_input,
+                                                            profiler=profiler)
+                                 for resampling_input, profiler in zip(resampling_inputs, profilers)]
+
+            # The memory-mapped correlations of the out-of-core mode are passed back by the paths of their files
+            workspace = OutOfCoreWorkspace.from_args(args=args, num_of_components=df.shape[1])
+            if workspace is not None:
+                iteration_results = [(resampled_data, workspace.save(array=correlations), did_clr_run)
+                                     for resampled_data, correlations, did_clr_run in iteration_results]
+        else:
+            dtype = np.dtype(args.get('dtype', 'float64'))
+            resampled_batch = []
+            for resampling_input, profiler in zip(resampling_inputs, profilers):
+                with profiler.stage('resampling'):
+                    resampled_batch.append(SparCCRunner.resample_iteration(df=df, resampling_input=resampling_input,
+                                                                           dtype=dtype))
+
+            # Compute log-ratio variances of every iteration at once into one stack
+            with profilers[0].stage('log_ratio_variance'):
+                log_ratio_variance_calculator = LogRatioVarianceCalculator(data=np.stack(resampled_batch), dtype=dtype)
+                log_ratio_variance_calculator.run()
+                log_ratio_variances = log_ratio_variance_calculator.result
+
+            # Compute the correlations of every iteration at once (the helper matrix is the same before the exclusions)
+            with profilers[0].stage('correlation'):
+                correlations = CorrelationUpdater.calculate_correlations(
+                    log_ratio_variances=log_ratio_variances,
+                    helper_matrix=None,
+                    helper_matrix_solver=HelperMatrixSolver(num_of_components=df.shape[1]),
+                    profiler=profilers[0]
+                )
+
+            iteration_results = [
+                SparCCRunner.exclude_strongly_correlated_pairs(args=args,
+                                                               resampled_data=resampled_data,
+                                                               log_ratio_variances=log_ratio_variances[index],
+                                                               correlations=correlations[index],
+                                                               profiler=profilers[index])
+                for index, resampled_data in enumerate(resampled_batch)
+            ]
+
+        for profiler in profilers:
+            profiler.close()
+
+        return [(*iteration_result, profiler.records)
+                for iteration_result, profiler in zip(iteration_results, profilers)]
+
+    @staticmethod
+    def run_iteration(df: pd.DataFrame, args: dict, resampling_input: np.ndarray | np.random.SeedSequence,
+                      profiler: StageProfiler | None = None) -> typing.Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        Runs one iteration of the algorithm: resampling, variance computation, and iterative correlation exclusion.
+
+        :param pd.DataFrame df: Input dataframe containing compositional data.
+        :param dict args: Dictionary of parameters controlling the threshold and exclusions.
+        :param np.ndarray | np.random.SeedSequence resampling_input: The already resampled data of the iteration,
+        or the seed sequence of the random stream used for resampling the data.
+        :param StageProfiler | None profiler: The profiler recording the stages of the iteration.
+        :return Tuple[np.ndarray, np.ndarray, bool]: The resampled data, the correlation matrix and the clr_run flag.
+        """
+        profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        dtype = np.dtype(args.get('dtype', 'float64'))
+        with profiler.stage('resampling'):
+            resampled_data = SparCCRunner.resample_iteration(df=df, resampling_input=resampling_input, dtype=dtype)
+
+        # Memory-mapped matrices and row tiles in the out-of-core mode
+        workspace = OutOfCoreWorkspace.from_args(args=args, num_of_components=df.shape[1])
+
+        # Compute log-ratio variances
+        with profiler.stage('log_ratio_variance'):
+            if workspace is not None:
+                log_ratio_variances = LogRatioVarianceCalculator(data=resampled_data, dtype=dtype,
+                                                                 out=workspace.empty(), tile_size=workspace.tile_size)
+                log_ratio_variances.run()
+                log_ratio_variances = log_ratio_variances.result
+            else:
+                log_ratio_variances = LogRatioVarianceCalculator(data=resampled_data, dtype=dtype)
+                log_ratio_variances.run()
+                log_ratio_variances = log_ratio_variances.result.copy()
+
+        return SparCCRunner.exclude_strongly_correlated_pairs(args=args,
+                                                              resampled_data=resampled_data,
+                                                              log_ratio_variances=log_ratio_variances,
+                                                              correlations=None,
+                                                              workspace=workspace,
+                                                              profiler=profiler)
+
+    @staticmethod
+    def exclude_strongly_correlated_pairs(args: dict, resampled_data: np.ndarray, log_ratio_variances: np.ndarray,
+                                          correlations: np.ndarray | None, workspace: OutOfCoreWorkspace | None = None,
+                                          profiler: StageProfiler | None = None
+                                          ) -> typing.Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        Computes the correlations of an iteration (if not computed yet) and iteratively removes the strongly
+        correlated pairs.
+
+        :param dict args: Dictionary of parameters controlling the threshold and exclusions.
+        :param np.ndarray resampled_data: The resampled data of the iteration.
+        :param np.ndarray log_ratio_variances: The log-ratio variances of the iteration (modified in place).
+        :param np.ndarray | None correlations: The correlations before the exclusion process, if already computed.
+        :param OutOfCoreWorkspace | None workspace: The workspace of the out-of-core mode (the dense helper matrix is
+        not built, the solver tracks the exclusions, and the correlations are computed into a memory-mapped matrix).
+        :param StageProfiler | None profiler: The profiler recording the stages of the iteration.
+        :return Tuple[np.ndarray, np.ndarray, bool]: The resampled data, the correlation matrix and the clr_run flag.
+        """
+        profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        num_of_components = log_ratio_variances.shape[1]
+
+        # Initialize helper matrix for variance calculations
+        helper_matrix = None
+        if workspace is None:
             helper_matrix = (np.ones((num_of_components, num_of_components)) +
                              np.diag([num_of_components - 2] * num_of_components))
+        # Solver mirroring the helper matrix, it replaces the repeated inversion of the helper matrix
+        helper_matrix_solver = HelperMatrixSolver(num_of_components=num_of_components)
 
-            # Compute correlations
-            correlations = CorrelationUpdater.calculate_correlation(
-                newly_calculated_log_ratio_variances=log_ratio_variances,
-                helper_matrix=helper_matrix,
-                initial_log_ratio_variance=None
-            )
+        # Compute correlations
+        if correlations is None:
+            with profiler.stage('correlation'):
+                correlations = CorrelationUpdater.calculate_correlation(
+                    newly_calculated_log_ratio_variances=log_ratio_variances,
+                    helper_matrix=helper_matrix,
+                    initial_log_ratio_variance=None,
+                    helper_matrix_solver=helper_matrix_solver,
+                    out=workspace.empty() if workspace is not None else None,
+                    tile_size=workspace.tile_size if workspace is not None else None,
+                    profiler=profiler
+                )
 
-            # Iteratively remove strongly correlated pairs
+        # Iteratively remove strongly correlated pairs
+        with profiler.stage('exclusion') as stage_record:
             iterative_process = StronglyCorrelatedPairHandler(log_ratio_variances=log_ratio_variances,
                                                               correlations=correlations,
                                                               helper_matrix=helper_matrix,
-                                                              exclusion_threshold=self.args['threshold'],
-                                                              exclusion_iterations=self.args['x_iter'],
-                                                              resampled_data=self.data)
+                                                              exclusion_threshold=args['threshold'],
+                                                              exclusion_iterations=args['x_iter'],
+                                                              resampled_data=resampled_data,
+                                                              helper_matrix_solver=helper_matrix_solver,
+                                                              workspace=workspace,
+                                                              profiler=profiler)
             iterative_process.run()
-            correlation_results.append(iterative_process.correlations)
+            stage_record["exclusion_steps"] = len(iterative_process.excluded_pairs)
 
-            # Save iteration results (correlation matrix and clr flag) into result_obj
-            result_obj.results[f"iteration_{iteration}"] = {
-                "correlation_matrix": iterative_process.correlations,
-                "clr_run": iterative_process.did_clr_run
-            }
+        return resampled_data, iterative_process.correlations, iterative_process.did_clr_run
 
-            if self.args["do_download_data"]:
-                # Delegate saving of correlation matrix and clr_run flag to SparCCResult
-                result_obj.save_iteration_data(iteration_dir=iteration_dir, iteration=iteration)
+    @staticmethod
+    def resample_iteration(df: pd.DataFrame, resampling_input: np.ndarray | np.random.SeedSequence,
+                           dtype: np.dtype | str = np.float64) -> np.ndarray:
+        """
+        Returns the resampled data of an iteration.
 
-        # Compute the median correlation matrix across iterations and store it in result_obj
-        result_obj.final_result = np.nanmedian(np.array(correlation_results), axis=0)
+        :param pd.DataFrame df: Input dataframe containing compositional data.
+        :param np.ndarray | np.random.SeedSequence resampling_input: The already resampled data of the iteration,
+        or the seed sequence of the random stream used for resampling the data.
+        :param np.dtype | str dtype: The floating point type of the resampled data.
+        :return np.ndarray: The resampled data.
+        """
+        if isinstance(resampling_input, np.random.SeedSequence):
+            # Resample the data with the random stream of the iteration
+            return SparCCRunner.estimate_component_fractions(df=df, rng=np.random.default_rng(resampling_input),
+                                                             dtype=dtype)
 
-        # Return the result object containing final and per-iteration information
-        return result_obj
+        return resampling_input
 
-    def estimate_component_fractions(self):
+    @staticmethod
+    def estimate_component_fractions(df: pd.DataFrame, rng: np.random.Generator,
+                                     dtype: np.dtype | str = np.float64) -> np.ndarray:
         """
-        Resample the data using a Dirichlet distribution applied row-wise.
+        Resample the data using a Dirichlet distribution applied column-wise.
 
-        Each row of the dataset is treated as a parameter vector for the Dirichlet distribution,
+        Each column of the dataset is treated as a parameter vector for the Dirichlet distribution,
         generating new resampled compositions while preserving the compositional nature of the data.
+        The fractions of every column are drawn in one vectorized call by the `DirichletResampler`.
+
+        :param pd.DataFrame df: Input dataframe containing compositional data.
+        :param np.random.Generator rng: The random generator used for the resampling.
+        :param np.dtype | str dtype: The floating point type of the resampled data.
+        :return np.ndarray: The resampled data.
         """
-        self.data = np.apply_along_axis(
-            lambda x: np.random.mtrand.dirichlet(x + 1),
-            axis=0,
-            arr=self.df
-        )
+        return DirichletResampler(data=df, rng=rng, dtype=dtype).resample()
@@ -0,0 +1,179 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+import functools
+import typing
+
+import numpy as np
+import pandas as pd
+
+from nlhs_tick_data_hungary.network.sparcc.correlation_updater import CorrelationUpdater
+from nlhs_tick_data_hungary.network.sparcc import DirichletResampler
+from nlhs_tick_data_hungary.network.sparcc import HelperMatrixSolver
+from nlhs_tick_data_hungary.network.sparcc import LogRatioVarianceCalculator
+from nlhs_tick_data_hungary.network.sparcc.sparcc_runner import SparCCRunner
+
+
+class SparCCStabilityEngine:
+    """
+    Estimates how stable the edges of a SparCC network are when samples (ticks) are left out.
+
+    SparCC is run on jackknife subsamples of the data: every subsample leaves out 'leave_out' samples (every single
+    sample in turn for the leave-one-out jackknife, or random sets of samples otherwise). The stability of an edge is
+    the fraction of the subsamples where its absolute median correlation exceeds 'stability_threshold'.
+
+    The subsamples share the Dirichlet replicates: normalising a subset of the rows of the Gamma draws of the full
+    data gives a Dirichlet sample of the subset, and the log-ratio variances do not depend on the normalisation. So the
+    column-wise log statistics (the cross products of the centered logarithms) are computed once per replicate, and
+    the covariances of a subsample are obtained by removing the contribution of the left out samples (O(k * D^2)
+    instead of O(N * D^2)). The subsamples are processed in batches, optionally on a process pool.
+    """
+
+    def __init__(self, df: pd.DataFrame, args: dict, executor: Executor | None = None):
+        """
+        Initializes the stability engine with data and parameters.
+
+        :param pd.DataFrame df: Input dataframe containing compositional data (samples in the rows).
+        :param dict args: Parameters of SparCC ('n_iter', 'threshold', 'x_iter', and optionally 'seed', 'dtype',
+        'n_jobs') and of the jackknife: 'leave_out' (number of samples left out from every subsample, 1 by default),
+        'n_subsamples' (number of random subsamples; every leave-one-out subsample is used if not given and
+        'leave_out' is 1, otherwise 100 by default) and 'stability_threshold' (an edge is present in a subsample if
+        its absolute median correlation is greater than this value, 0.3 by default).
+        :param Executor | None executor: An executor to run the batches of subsamples with. If given, 'n_jobs' is
+        ignored.
+        """
+        self.df = df
+        self.args = args
+        self.executor = executor
+
+        self.seed_sequence = np.random.SeedSequence(self.args.get('seed'))
+
+        # The samples left out from every subsample
+        self.dropped_samples: list = []
+
+        # Attributes to store the edge-wise stability frequencies and the mean of the median correlations
+        self.result: (np.ndarray | None) = None
+        self.mean_correlations: (np.ndarray | None) = None
+
+    def run(self):
+        """
+        Runs SparCC on every subsample and computes the edge-wise stability frequencies.
+        """
+        self.dropped_samples = self.get_dropped_samples()
+        stability_threshold = self.args.get('stability_threshold', 0.3)
+
+        num_of_components = self.df.shape[1]
+        num_of_present = np.zeros((num_of_components, num_of_components), dtype=np.int64)
+        num_of_valid = np.zeros((num_of_components, num_of_components), dtype=np.int64)
+        sum_of_correlations = np.zeros((num_of_components, num_of_components))
+        for median_correlations in self.run_subsamples():
+            valid = ~np.isnan(median_correlations)
+            num_of_present += valid & (np.abs(np.where(valid, median_correlations, 0)) > stability_threshold)
+            num_of_valid += valid
+            sum_of_correlations += np.where(valid, median_correlations, 0)
+
+        self.result = num_of_present / len(self.dropped_samples)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.mean_correlations = sum_of_correlations / num_of_valid
+
+    def get_dropped_samples(self) -> list:
+        """
+        Selects the samples left out from every subsample.
+
+        :return list: The sorted indices of the left out samples of every subsample.
+        """
+        num_of_samples = self.df.shape[0]
+        leave_out = self.args.get('leave_out', 1)
+        if leave_out == 1 and self.args.get('n_subsamples') is None:
+            return [np.array([sample]) for sample in range(num_of_samples)]
+
+        # The random subsamples use a stream that is not used by the Dirichlet replicates
+        rng = np.random.default_rng(np.random.SeedSequence(entropy=self.seed_sequence.entropy,
+                                                           spawn_key=(self.args['n_iter'],)))
+        return [np.sort(rng.choice(num_of_samples, size=leave_out, replace=False))
+                for _ in range(self.args.get('n_subsamples') or 100)]
+
+    def run_subsamples(self) -> typing.Iterator[np.ndarray]:
+        """
+        Draws the shared Dirichlet replicates and runs SparCC on the subsamples in batches, either serially or on an
+        executor (process pool).
+
+        :return Iterator: An iterator over the median correlation matrices of the subsamples.
+        """
+        # The replicates use the same random streams as the iterations of `SparCCRunner` with the same seed
+        dtype = self.args.get('dtype', 'float64')
+        gamma_draws = np.stack([
+            DirichletResampler(data=self.df, rng=np.random.default_rng(iteration_seed), dtype=dtype).draw_gamma()
+            for iteration_seed in np.random.SeedSequence(self.seed_sequence.entropy).spawn(self.args['n_iter'])
+        ])
+
+        n_jobs = self.args.get('n_jobs', 1) or 1
+        num_of_batches = max(1, min(n_jobs, len(self.dropped_samples)))
+        batches = [list(batch) for batch in np.array_split(np.arange(len(self.dropped_samples)), num_of_batches)]
+        batches = [[self.dropped_samples[index] for index in batch] for batch in batches]
+        run_subsample_batch = functools.partial(SparCCStabilityEngine.run_subsample_batch, self.args, gamma_draws)
+
+        if self.executor is not None:
+            batch_results = self.executor.map(run_subsample_batch, batches)
+        elif n_jobs <= 1:
+            batch_results = map(run_subsample_batch, batches)
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                for batch_result in executor.map(run_subsample_batch, batches):
+                    yield from batch_result
+            return
+
+        for batch_result in batch_results:
+            yield from batch_result
+
+    @staticmethod
+    def run_subsample_batch(args: dict, gamma_draws: np.ndarray, dropped_samples: list) -> typing.List[np.ndarray]:
+        """
+        Runs SparCC on a batch of subsamples with the shared Dirichlet replicates.
+
+        :param dict args: Parameters of SparCC.
+        :param np.ndarray gamma_draws: The Gamma draws of the replicates of the full data with shape
+        (replicates, samples, components).
+        :param list dropped_samples: The indices of the left out samples of every subsample of the batch.
+        :return List[np.ndarray]: The median correlation matrix of every subsample.
+        """
+        num_of_samples, num_of_components = gamma_draws.shape[1:]
+
+        # Column-wise log statistics of every replicate, shared by the subsamples
+        centered_log_data = np.log(gamma_draws)
+        centered_log_data -= centered_log_data.mean(axis=-2, keepdims=True)
+        cross_products = np.matmul(np.swapaxes(centered_log_data, -1, -2), centered_log_data)
+
+        median_correlations = []
+        for dropped in dropped_samples:
+            kept = np.setdiff1d(np.arange(num_of_samples), dropped)
+            num_of_kept = len(kept)
+
+            # Remove the left out samples from the statistics: the covariance of the kept samples is
+            # (X^T X - X_d^T X_d - s s^T / n) / (n - 1), where s is the sum of the kept centered rows (-sum of X_d)
+            dropped_log_data = centered_log_data[:, dropped, :]
+            kept_sums = -dropped_log_data.sum(axis=-2)
+            covariance = cross_products - np.matmul(np.swapaxes(dropped_log_data, -1, -2), dropped_log_data)
+            covariance -= kept_sums[:, :, np.newaxis] * kept_sums[:, np.newaxis, :] / num_of_kept
+            covariance /= num_of_kept - 1
+            log_ratio_variances = LogRatioVarianceCalculator.convert_covariance_to_log_ratio_variance(
+                covariance=covariance)
+
+            # Correlations of every replicate at once, then the exclusion process of every replicate
+            correlations = CorrelationUpdater.calculate_correlations(
+                log_ratio_variances=log_ratio_variances,
+                helper_matrix=None,
+                helper_matrix_solver=HelperMatrixSolver(num_of_components=num_of_components)
+            )
+            for replicate in range(len(gamma_draws)):
+                # Dirichlet sample of the kept samples (used by the CLR fallback)
+                resampled_data = gamma_draws[replicate, kept]
+                resampled_data = resampled_data / resampled_data.sum(axis=-2, keepdims=True)
+                _, correlations[replicate], _ = SparCCRunner.exclude_strongly_correlated_pairs(
+                    args=args,
+                    resampled_data=resampled_data,
+                    log_ratio_variances=log_ratio_variances[replicate],
+                    correlations=correlations[replicate]
+                )
+
+            median_correlations.append(np.nanmedian(correlations, axis=0))
+
+        return median_correlations
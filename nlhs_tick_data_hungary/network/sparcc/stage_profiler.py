@@ -0,0 +1,174 @@
+import contextlib
+import threading
+import time
+import tracemalloc
+import typing
+
+import pandas as pd
+
+
+class StageProfiler:
+    """
+    A class for recording the wall time and the peak allocated memory of the stages of the SparCC algorithm.
+
+    Every `stage` block adds a record: the name of the stage, the iteration it belongs to (None for the stages of the
+    whole run), the wall time, the peak memory allocated during the stage (traced by `tracemalloc`, so it contains the
+    numpy arrays and it is process-wide, e.g. the background writer's allocations are also included) and optional
+    counters (e.g. the number of exclusion steps). Stages can be nested.
+
+    The peak of `tracemalloc` is shared by the threads, so only the stages of the main thread record (and reset) it.
+    The stages of other threads (e.g. the 'writing' stage of the background writer) record only the wall time, their
+    peak memory is None.
+
+    If the profiler is disabled, `stage` returns the same no-op context manager every time, so the instrumentation
+    costs only a method call per stage.
+    """
+
+    def __init__(self, enabled: bool = False):
+        """
+        Initializes the profiler and starts tracing the memory allocations if enabled.
+
+        :param bool enabled: Whether to record the stages.
+        """
+        self.enabled = enabled
+
+        # List to store the records of the stages
+        self.records: list = []
+
+        # Stack of the open stages of every thread (for the peak memory of nested stages)
+        self.open_stages = threading.local()
+
+        # No-op context manager of the disabled profiler (the counters written into its dict are discarded)
+        self.disabled_stage = contextlib.nullcontext({})
+
+        # The profiler stops tracing only if it started it
+        self.started_tracing = False
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stage(self, name: str, iteration: int | None = None) -> typing.ContextManager[dict]:
+        """
+        Returns a context manager recording a stage. The dict returned by the context manager can be used for adding
+        counters to the record of the stage.
+
+        :param str name: The name of the stage.
+        :param int | None iteration: The iteration the stage belongs to.
+        :return ContextManager[dict]: The context manager recording the stage.
+        """
+        if not self.enabled:
+            return self.disabled_stage
+
+        return self.record_stage(name=name, iteration=iteration)
+
+    @contextlib.contextmanager
+    def record_stage(self, name: str, iteration: int | None) -> typing.Iterator[dict]:
+        """
+        Records the wall time and the peak allocated memory of a stage (only the wall time outside the main thread).
+
+        :param str name: The name of the stage.
+        :param int | None iteration: The iteration the stage belongs to.
+        :return Iterator[dict]: The record of the stage (counters can be added to it).
+        """
+        record = {"stage": name, "iteration": iteration}
+        if threading.current_thread() is not threading.main_thread():
+            start_time = time.perf_counter()
+            try:
+                yield record
+            finally:
+                record["wall_time"] = time.perf_counter() - start_time
+                record["peak_memory"] = None
+                self.records.append(record)
+            return
+
+        open_stages = self.get_open_stages()
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        # The peak is reset for the new stage, so the peak so far is passed to the enclosing stage
+        if open_stages:
+            open_stages[-1]["peak"] = max(open_stages[-1]["peak"], peak_memory)
+        tracemalloc.reset_peak()
+
+        open_stages.append({"start": current_memory, "peak": current_memory})
+        start_time = time.perf_counter()
+        try:
+            yield record
+        finally:
+            wall_time = time.perf_counter() - start_time
+            stage_memory = open_stages.pop()
+            stage_peak = max(tracemalloc.get_traced_memory()[1], stage_memory["peak"])
+            if open_stages:
+                open_stages[-1]["peak"] = max(open_stages[-1]["peak"], stage_peak)
+
+            record["wall_time"] = wall_time
+            record["peak_memory"] = stage_peak - stage_memory["start"]
+            self.records.append(record)
+
+    def get_open_stages(self) -> list:
+        """
+        Returns the stack of the open stages of the current thread.
+
+        :return list: The stack of the open stages.
+        """
+        if not hasattr(self.open_stages, "stack"):
+            self.open_stages.stack = []
+        return self.open_stages.stack
+
+    def add_records(self, records: list, iteration: int | None = None):
+        """
+        Adds records made by another profiler (e.g. in a worker process) and assigns them to an iteration.
+
+        :param list records: The records to add.
+        :param int | None iteration: The iteration the records belong to.
+        """
+        if not self.enabled:
+            return
+
+        for record in records:
+            record = dict(record)
+            if record["iteration"] is None:
+                record["iteration"] = iteration
+            self.records.append(record)
+
+    def close(self):
+        """
+        Stops tracing the memory allocations if the profiler started it.
+        """
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the records of the stages as a DataFrame (one row per stage and iteration).
+
+        :return pd.DataFrame: The records with the 'stage', 'iteration', 'wall_time' (seconds) and 'peak_memory'
+        (bytes) columns, and the columns of the counters.
+        """
+        return pd.DataFrame(self.records, columns=None if self.records else
+                            ["stage", "iteration", "wall_time", "peak_memory"])
+
+    def summarize(self) -> dict:
+        """
+        Summarizes the records per stage.
+
+        :return dict: The number of calls, the total and mean wall time, the maximal peak memory (None if the stage
+        ran only outside the main thread) and the sum of the counters of every stage.
+        """
+        records = self.to_dataframe()
+        summary = {}
+        for stage, stage_records in records.groupby("stage", sort=False):
+            summary[stage] = {
+                "calls": len(stage_records),
+                "total_wall_time": float(stage_records["wall_time"].sum()),
+                "mean_wall_time": float(stage_records["wall_time"].mean()),
+                "max_peak_memory": (int(stage_records["peak_memory"].max())
+                                    if stage_records["peak_memory"].notna().any() else None)
+            }
+            # Counters recorded by the stage (e.g. 'exclusion_steps')
+            counter_columns = [column for column in stage_records.columns
+                               if column not in ("stage", "iteration", "wall_time", "peak_memory")]
+            for counter in counter_columns:
+                if stage_records[counter].notna().any():
+                    summary[stage][counter] = int(stage_records[counter].sum())
+
+        return summary
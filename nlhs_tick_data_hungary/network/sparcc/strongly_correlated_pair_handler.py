@@ -5,6 +5,9 @@ import numpy as np
 
 from nlhs_tick_data_hungary.network.sparcc.correlation_updater import CorrelationUpdater
 from nlhs_tick_data_hungary.network.sparcc.clr_calculator import CLRCalculator
+from nlhs_tick_data_hungary.network.sparcc.helper_matrix_solver import HelperMatrixSolver
+from nlhs_tick_data_hungary.network.sparcc.out_of_core_workspace import OutOfCoreWorkspace
+from nlhs_tick_data_hungary.network.sparcc.stage_profiler import StageProfiler
 
 
 class StronglyCorrelatedPairHandler:
@@ -13,25 +16,39 @@ class StronglyCorrelatedPairHandler:
     Iteratively removes the most correlated pairs until a defined exclusion threshold is met.
     """
 
-    def __init__(self, log_ratio_variances: np.ndarray, correlations: np.ndarray, helper_matrix: np.ndarray,
-                 exclusion_threshold: float, exclusion_iterations: int, resampled_data: np.ndarray):
+    def __init__(self, log_ratio_variances: np.ndarray, correlations: np.ndarray, helper_matrix: np.ndarray | None,
+                 exclusion_threshold: float, exclusion_iterations: int, resampled_data: np.ndarray,
+                 helper_matrix_solver: HelperMatrixSolver | None = None,
+                 workspace: OutOfCoreWorkspace | None = None, profiler: StageProfiler | None = None):
         """
         Initializes the handler with necessary matrices and exclusion parameters.
 
         :param np.ndarray log_ratio_variances: Matrix containing variance information.
         :param np.ndarray correlations: Precomputed correlation matrix.
-        :param np.ndarray helper_matrix: Helper matrix to track modifications.
+        :param np.ndarray | None helper_matrix: Helper matrix to track modifications (it can be None if a solver is
+        given).
         :param float exclusion_threshold: Threshold above which correlations are considered too strong.
         :param int exclusion_iterations: Maximum number of exclusion iterations allowed.
         :param np.ndarray resampled_data: Resampled original data.
+        :param HelperMatrixSolver | None helper_matrix_solver: Solver that mirrors the modifications of the helper
+        matrix, used for the O(D^2) recalculation of the basis variances after each exclusion.
+        :param OutOfCoreWorkspace | None workspace: If given, the matrices are memory-mapped and processed in row tiles
+        (the correlation matrix is updated in place and the strongest pair is searched tile by tile).
+        :param StageProfiler | None profiler: The profiler recording the 'basis_variance' stages of the updates.
         """
         self.log_ratio_variances = log_ratio_variances
+        self.workspace = workspace
+        self.profiler = profiler
 
         # We save the initial log-ratio variances for the correlation calculation
-        self.initial_log_ratio_variances = log_ratio_variances.copy()
+        if self.workspace is not None:
+            self.initial_log_ratio_variances = self.workspace.copy(log_ratio_variances)
+        else:
+            self.initial_log_ratio_variances = log_ratio_variances.copy()
 
         self.correlations = correlations
         self.helper_matrix = helper_matrix
+        self.helper_matrix_solver = helper_matrix_solver
         self.exclusion_threshold = exclusion_threshold
         self.exclusion_iterations = exclusion_iterations
         self.resampled_data = resampled_data
@@ -40,6 +57,17 @@ class StronglyCorrelatedPairHandler:
         self.excluded_pairs = []  # List to store excluded pairs
         self.excluded_components = np.array([])  # Array to track components excluded due to excessive exclusions
 
+        # Reusable buffer for the absolute values of the candidate correlations and the mask of the candidate pairs
+        # (upper triangle without the diagonal and the already excluded pairs). The masked elements of the buffer
+        # are zero, the others are overwritten in place at every exclusion step. The out-of-core mode searches the
+        # tiles of the correlation matrix instead.
+        self.candidate_correlations: (np.ndarray | None) = None
+        self.candidate_mask: (np.ndarray | None) = None
+        if self.workspace is None:
+            self.candidate_correlations = np.zeros((self.num_of_components, self.num_of_components),
+                                                   dtype=correlations.dtype)
+            self.candidate_mask = np.triu(np.ones((self.num_of_components, self.num_of_components), dtype=bool), 1)
+
         self.did_clr_run: bool = False
 
     def run(self):
@@ -70,16 +98,24 @@ class StronglyCorrelatedPairHandler:
 
         self.excluded_pairs.append(to_exclude)
         i, j = to_exclude
-        # Update helper matrix to reflect exclusion
-        self.helper_matrix[i, j] -= 1
-        self.helper_matrix[j, i] -= 1
-        self.helper_matrix[i, i] -= 1
-        self.helper_matrix[j, j] -= 1
+        # Remove the pair from the candidates
+        if self.candidate_mask is not None:
+            self.candidate_mask[i, j] = False
+            self.candidate_correlations[i, j] = 0
 
-        # Set excluded pairs to zero in matrix containing the variances of the log-ratios
-        inds = tuple(zip(*self.excluded_pairs))
-        self.log_ratio_variances[inds] = 0
-        self.log_ratio_variances.T[inds] = 0
+        # Update helper matrix to reflect exclusion
+        if self.helper_matrix is not None:
+            self.helper_matrix[i, j] -= 1
+            self.helper_matrix[j, i] -= 1
+            self.helper_matrix[i, i] -= 1
+            self.helper_matrix[j, j] -= 1
+        if self.helper_matrix_solver is not None:
+            self.helper_matrix_solver.exclude_pair(i, j)
+
+        # Set the excluded pair to zero in matrix containing the variances of the log-ratios
+        # (the previously excluded pairs are already zero)
+        self.log_ratio_variances[i, j] = 0
+        self.log_ratio_variances[j, i] = 0
 
         return True  # Continue the exclusion process
 
@@ -90,7 +126,12 @@ class StronglyCorrelatedPairHandler:
         self.correlations = CorrelationUpdater.calculate_correlation(
             newly_calculated_log_ratio_variances=self.log_ratio_variances,
             helper_matrix=self.helper_matrix,
-            initial_log_ratio_variance=self.initial_log_ratio_variances
+            initial_log_ratio_variance=self.initial_log_ratio_variances,
+            helper_matrix_solver=self.helper_matrix_solver,
+            # The out-of-core mode overwrites the memory-mapped correlation matrix tile by tile
+            out=self.correlations if self.workspace is not None else None,
+            tile_size=self.workspace.tile_size if self.workspace is not None else None,
+            profiler=self.profiler
         )
         for excluded_component in self.excluded_components:
             self.correlations[excluded_component, :] = np.nan
@@ -103,18 +144,50 @@ class StronglyCorrelatedPairHandler:
         :return (Tuple[int, int] | None): A tuple (i, j) of indices representing the most correlated pair,
          or None if no pair exceeds the threshold.
         """
-        # Consider only upper triangle of the correlation matrix for faster calculation
-        corr_temp = np.triu(np.abs(self.correlations), 1)
-        if self.excluded_pairs:
-            corr_temp[tuple(zip(*self.excluded_pairs))] = 0  # Mask already excluded pairs
+        if self.workspace is not None:
+            return self.find_new_excluded_pair_in_tiles()
+
+        # Every correlation changes after an update, so the absolute values of the candidate pairs (upper triangle
+        # without the already excluded pairs) are written into the reusable buffer without new allocations
+        np.abs(self.correlations, out=self.candidate_correlations, where=self.candidate_mask)
 
         # Find the most correlated pair
-        i, j = np.unravel_index(np.argmax(corr_temp), corr_temp.shape)
-        corr_max = corr_temp[i, j]
+        i, j = np.unravel_index(np.argmax(self.candidate_correlations), self.candidate_correlations.shape)
+        corr_max = self.candidate_correlations[i, j]
 
         # Return the pair if correlation exceeds the threshold, otherwise return None
         return (i, j) if corr_max > self.exclusion_threshold else None
 
+    def find_new_excluded_pair_in_tiles(self) -> Tuple[int, int] | None:
+        """
+        Identifies the most correlated pair like `find_new_excluded_pair`, but only one row tile of the (memory-mapped)
+        correlation matrix is loaded at a time.
+
+        :return (Tuple[int, int] | None): A tuple (i, j) of indices representing the most correlated pair,
+         or None if no pair exceeds the threshold.
+        """
+        excluded_pairs = np.array(self.excluded_pairs, dtype=np.int64).reshape(-1, 2)
+        most_correlated_pair, corr_max = None, -np.inf
+
+        for start in range(0, self.num_of_components, self.workspace.tile_size):
+            stop = min(start + self.workspace.tile_size, self.num_of_components)
+            candidates = np.abs(self.correlations[start:stop])
+
+            # Only the upper triangle without the already excluded pairs are candidates
+            candidates[np.arange(self.num_of_components)[np.newaxis, :] <= np.arange(start, stop)[:, np.newaxis]] = 0
+            in_tile = (excluded_pairs[:, 0] >= start) & (excluded_pairs[:, 0] < stop)
+            candidates[excluded_pairs[in_tile, 0] - start, excluded_pairs[in_tile, 1]] = 0
+
+            i, j = np.unravel_index(np.argmax(candidates), candidates.shape)
+            # The search over the whole matrix would select the first NaN candidate, which never exceeds the threshold
+            if np.isnan(candidates[i, j]):
+                return None
+            # Ties are resolved by the first occurrence, like in the search over the whole matrix
+            if candidates[i, j] > corr_max:
+                most_correlated_pair, corr_max = (start + i, j), candidates[i, j]
+
+        return most_correlated_pair if corr_max > self.exclusion_threshold else None
+
     def exclude_components(self):
         """
         Identifies and excludes components that have been involved in too many exclusions, based on a predefined
@@ -133,16 +206,23 @@ class StronglyCorrelatedPairHandler:
             if len(self.excluded_components) > (self.num_of_components - 4):
                 warnings.warn("Too many components had to be excluded from the analysis. Returning result of CLR.")
                 clr_calculator = CLRCalculator(data=self.resampled_data)
-                self.correlations = clr_calculator.run()
+                if self.workspace is not None:
+                    # The out-of-core mode writes the correlations into the memory-mapped matrix tile by tile
+                    clr_calculator.run_clr_tiled(out=self.correlations, tile_size=self.workspace.tile_size)
+                else:
+                    self.correlations = clr_calculator.run().astype(self.correlations.dtype, copy=False)
                 self.did_clr_run = True
 
             # Update matrices to reflect exclusions
             for comp in newly_excluded_components:
                 self.log_ratio_variances[comp, :] = 0
                 self.log_ratio_variances[:, comp] = 0
-                self.helper_matrix[comp, :] = 0
-                self.helper_matrix[:, comp] = 0
-                self.helper_matrix[comp, comp] = 1  # Keep diagonal elements to maintain matrix structure
+                if self.helper_matrix is not None:
+                    self.helper_matrix[comp, :] = 0
+                    self.helper_matrix[:, comp] = 0
+                    self.helper_matrix[comp, comp] = 1  # Keep diagonal elements to maintain matrix structure
+                if self.helper_matrix_solver is not None:
+                    self.helper_matrix_solver.exclude_component(comp)
 
             # Convert excluded components set to a numpy array for consistency
             self.excluded_components = np.array(list(self.excluded_components))
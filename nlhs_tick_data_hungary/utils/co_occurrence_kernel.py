@@ -0,0 +1,75 @@
+import numpy as np
+
+
+class CoOccurrenceKernel:
+    """
+    A utility class for counting the co-occurrences of the bacteria, i.e. the matrix product of the data with its
+    transpose.
+
+    If the data is presence/absence data (only zeros and ones), the samples of every bacterium are packed into bits
+    (8 samples per byte, 64 per word), and the joint presences are counted with a bitwise AND and a popcount
+    (`np.bitwise_count`) of the words, which needs 64 times less memory than the float data. Other data (counts,
+    missing values) falls back to a dense float matrix product.
+    """
+
+    @staticmethod
+    def is_binary(values: np.ndarray) -> bool:
+        """
+        Checks whether the data contains only zeros and ones.
+
+        :param np.ndarray values: The data
+        :return bool: True if every value is 0 or 1
+        """
+        return bool(np.all((values == 0) | (values == 1)))
+
+    @staticmethod
+    def pack(values: np.ndarray) -> np.ndarray:
+        """
+        Packs the presences of the bacteria into 64-bit words along the last (samples) axis.
+
+        :param np.ndarray values: The presence/absence data with shape (..., bacteria, samples)
+        :return np.ndarray: The packed data with shape (..., bacteria, words)
+        """
+        packed = np.packbits(np.asarray(values) != 0, axis=-1)
+
+        # Pad the bytes to whole 64-bit words (the padding bits are absences), at least one word is kept
+        num_of_padding_bytes = -packed.shape[-1] % 8 if packed.shape[-1] > 0 else 8
+        if num_of_padding_bytes:
+            packed = np.pad(packed, [(0, 0)] * (packed.ndim - 1) + [(0, num_of_padding_bytes)])
+
+        return np.ascontiguousarray(packed).view(np.uint64)
+
+    @staticmethod
+    def count_joint_presences(packed: np.ndarray) -> np.ndarray:
+        """
+        Counts the joint presences of every pair of bacteria from the packed data.
+
+        :param np.ndarray packed: The packed data with shape (..., bacteria, words), see `pack`
+        :return np.ndarray: The number of the samples where both bacteria are present with shape
+        (..., bacteria, bacteria)
+        """
+        num_of_bacteria = packed.shape[-2]
+        counts = np.zeros((*packed.shape[:-1], num_of_bacteria), dtype=np.int64)
+
+        # Row by row (the temporary words of a row stay small), only the upper triangle is counted
+        for row in range(num_of_bacteria):
+            joint_presences = packed[..., row:row + 1, :] & packed[..., row:, :]
+            counts[..., row, row:] = np.bitwise_count(joint_presences).sum(axis=-1, dtype=np.int64)
+
+        # The counts are symmetric
+        return counts + np.swapaxes(np.triu(counts, k=1), -1, -2)
+
+    @classmethod
+    def run(cls, values: np.ndarray) -> np.ndarray:
+        """
+        Computes the co-occurrences of the bacteria (the product of the data with its transpose), with the bit-packed
+        kernel for presence/absence data and with a dense float product otherwise.
+
+        :param np.ndarray values: The data with shape (..., bacteria, samples)
+        :return np.ndarray: The co-occurrences (float) with shape (..., bacteria, bacteria)
+        """
+        if cls.is_binary(values):
+            return cls.count_joint_presences(packed=cls.pack(values=values)).astype(float)
+
+        values = np.asarray(values, dtype=float)
+        return np.matmul(values, np.swapaxes(values, -1, -2))
@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
 
+from nlhs_tick_data_hungary.utils.co_occurrence_kernel import CoOccurrenceKernel
+
 
 class NetworkHelper:
     """
@@ -13,13 +15,14 @@ class NetworkHelper:
         """
         Method for creating a crosstable for the co-occurrence network. The number in the ith row nad jth column means
         how many times the ith AND the jth bactria was found on every tick. The diagonal values are replaced with NaN.
+        Presence/absence data is counted with the bit-packed kernel (see `CoOccurrenceKernel`).
 
         :param pd.DataFrame df: A DataFrame where rows are the bacteria and columns are the samples
 
         :return pd.DataFrame: Crosstable DataFrame with NaN on the diagonal
         """
         # Compute the dot product of the DataFrame with its transpose
-        final = df.dot(df.T).astype(float)
+        final = pd.DataFrame(CoOccurrenceKernel.run(values=df.to_numpy()), index=df.index, columns=df.index)
 
         # Replace diagonal elements with NaN
         np.fill_diagonal(final.values, np.nan)
@@ -49,3 +52,20 @@ class NetworkHelper:
             pass
 
         return df
+
+    @staticmethod
+    def get_type_positions(columns: pd.Index, to_type: str) -> np.ndarray:
+        """
+        Returns the positions of the columns of the specified type, like `select_type` selects them: the columns that
+        contain 'Male' or 'Female' in their names, or every column if 'Összes' (All) is selected.
+
+        :param pd.Index columns: The column names indicating gender categories
+        :param str to_type: The type of selection - 'Hímek' (Males), 'Nőstények' (Females), or 'Összes' (All)
+
+        :return np.ndarray: The positions of the columns of the selected type
+        """
+        like = {'Hímek': 'Male', 'Nőstények': 'Female'}.get(to_type)
+        if like is None:
+            return np.arange(len(columns))
+
+        return np.flatnonzero([like in str(column) for column in columns])